@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from hurdat import file_hash
+
+# On-disk store for arrays derived from a HURDAT2 release, shared by the
+# exposure grid and the climatology.
+#
+# Each entry is a directory <directory>/<source hash><suffix> holding one
+# memory-mappable .npy per array in `names` plus meta.json with the other
+# (JSON) values of the dict and the store's fixed `meta`. The suffix carries
+# the format version and cell size, so entries of an older format are never
+# read. Entries are written to a private directory and moved into place;
+# when another process completed the same entry first, its copy is kept.
+# Once an entry is in place, older entries of the same suffix are deleted,
+# like hurdat.write_cache does; processes still mapping their files keep
+# them until they unmap them.
+
+class ArrayStore:
+    # `build(path)` returns the dict to store for the HURDAT2 file `path`
+    def __init__(self, names, suffix, build, meta=None):
+        self.names = names
+        self.suffix = suffix
+        self.build = build
+        self.meta = meta or {}
+
+    def path(self, source, directory):
+        return os.path.join(directory, f"{file_hash(source)[:16]}{self.suffix}")
+
+    def save(self, values, target):
+        tmp = f"{target}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        for name in self.names:
+            np.save(os.path.join(tmp, f"{name}.npy"), values[name])
+        meta = {key: value for key, value in values.items() if key not in self.names}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as file:
+            json.dump({**meta, **self.meta}, file)
+        # A complete target is kept, a partial one (no meta.json) replaced
+        try:
+            if not os.path.exists(os.path.join(target, 'meta.json')):
+                shutil.rmtree(target, ignore_errors=True)
+                os.replace(tmp, target)
+        except OSError:
+            if not os.path.exists(os.path.join(target, 'meta.json')):
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.prune(os.path.dirname(target), target)
+        return target
+
+    # Delete the entries in `directory` other than `keep`
+    def prune(self, directory, keep):
+        for entry in os.listdir(directory):
+            stale = os.path.join(directory, entry)
+            if entry.endswith(self.suffix) and stale != keep and os.path.isdir(stale):
+                shutil.rmtree(stale, ignore_errors=True)
+
+    def read(self, target):
+        with open(os.path.join(target, 'meta.json')) as file:
+            values = json.load(file)
+        values.update({name: np.load(os.path.join(target, f"{name}.npy"), mmap_mode='r') for name in self.names})
+        values['shape'] = tuple(values['shape'])
+        return values
+
+    # Newest complete entry in `directory`, or None
+    def latest(self, directory):
+        if not os.path.isdir(directory):
+            return None
+        entries = [os.path.join(directory, entry) for entry in os.listdir(directory)
+                   if entry.endswith(self.suffix) and os.path.exists(os.path.join(directory, entry, 'meta.json'))]
+        return max(entries, key=os.path.getmtime, default=None)
+
+    # Values for `source`, built and saved first when missing. With
+    # build=False the newest entry of an earlier release (or None) is
+    # returned instead, leaving the build to the caller.
+    def load(self, source, directory, build=True):
+        target = self.path(source, directory)
+        if not os.path.exists(os.path.join(target, 'meta.json')):
+            if not build:
+                target = self.latest(directory)
+                return self.read(target) if target else None
+            os.makedirs(directory, exist_ok=True)
+            self.save(self.build(source), target)
+        return self.read(target)
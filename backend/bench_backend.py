@@ -0,0 +1,351 @@
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# End-to-end benchmark of the Flask app with local stand-ins for every
+# external service, so it runs offline and reproducibly:
+#
+#   Earth Engine   -> a fake `sat` module whose URLs point at a local server
+#                     returning a canned GIF
+#   Gemini         -> a fake `google.generativeai` with configurable latency
+#   Pinecone       -> a pc.LocalIndex snapshot of random article vectors
+#   embeddings     -> a fake `embed` module returning seeded random vectors
+#   geocoding      -> a synthetic zip_centroids.csv (offline resolver) backed
+#                     by a fake Google geocoder for points it does not cover,
+#                     or only the fake geocoder with latency (--geocode-latency)
+#
+# For each synthetic HURDAT2 size the app is imported in a fresh process
+# (it loads its data at import) inside a scratch directory, served with a
+# threaded werkzeug server, and /find_hurricanes and /analysis are driven at
+# each concurrency level. Reports throughput and p50/p99 latency.
+#
+# Run from backend/: python bench_backend.py [--sizes 500,2000,8000] [--concurrency 1,8,32]
+
+EMBED_DIM = 1024
+# Query area: the Florida peninsula, where the insurance table has ZIPs
+LAT_RANGE = (26.0, 30.0)
+LNG_RANGE = (-82.5, -80.2)
+
+
+# HURDAT2 text with `storms` storms spread over the last 15 years, tracking
+# north-west from the tropical Atlantic
+def synthetic_hurdat2(path, storms, seed=0):
+    rng = np.random.default_rng(seed)
+    first_year = datetime.now().year - 14
+    per_year = -(-storms // 15)
+    with open(path, 'w') as file:
+        for s in range(storms):
+            year = first_year + s // per_year
+            fixes = int(rng.integers(8, 60))
+            file.write(f"AL{s % per_year + 1:02d}{year},{'STORM' + str(s):>19},{fixes:>7},\n")
+            lat, lon = rng.uniform(12, 25), rng.uniform(-75, -45)
+            for i in range(fixes):
+                lat += rng.uniform(0.1, 0.6)
+                lon -= rng.uniform(-0.2, 0.8)
+                radii = [int(rng.choice([-999, 0, 30, 60, 120, 200])) for _ in range(12)]
+                file.write(f"{year}08{1 + i // 4:02d}, {(i % 4) * 6:02d}00,  , HU, {lat:4.1f}N, {abs(lon):5.1f}W, "
+                           f"{int(rng.integers(35, 160)):3d}, {int(rng.integers(900, 1010)):4d}, "
+                           + ", ".join(f"{r:4d}" for r in radii) + ",\n")
+
+
+def canned_gif(frames=12, size=160, seed=0):
+    import imageio
+    rng = np.random.default_rng(seed)
+    buffer = io.BytesIO()
+    imageio.mimwrite(buffer, rng.integers(0, 255, (frames, size, size, 3), dtype=np.uint8), format='gif')
+    return buffer.getvalue()
+
+
+# Serves `body` for every GET after `latency` seconds; returns (server, base URL)
+def serve_bytes(body, latency=0.0, content_type='image/gif'):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def fake_sat(base_url, latency):
+    module = types.ModuleType('sat')
+    snap_deg = 0.01
+
+    class ImgSat:
+        def bbox(self, lat, long):
+            lat = round(round(lat / snap_deg) * snap_deg, 6)
+            long = round(round(long / snap_deg) * snap_deg, 6)
+            return (long - 0.05, lat - 0.05, long + 0.05, lat + 0.05)
+
+        def query(self, lat, long):
+            time.sleep(latency)
+            return f"{base_url}/thumb/{lat:.2f}_{long:.2f}.gif"
+
+    module.ImgSat = ImgSat
+    module.SNAP_DEG = snap_deg
+    return module
+
+
+# Stub Gemini: uploads are ACTIVE after one poll, and generation takes
+# `latency` seconds spread over `chunks` streamed parts
+def fake_genai(latency, upload_latency, chunks=8):
+    module = types.ModuleType('google.generativeai')
+    ns = types.SimpleNamespace
+    counter = iter(range(1 << 62))
+
+    def text_response(text):
+        return ns(candidates=[ns(content=ns(parts=[ns(text=text)]))])
+
+    class GenerativeModel:
+        def __init__(self, model_name=None, **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, contents, stream=False, request_options=None):
+            words = [f"<b>chunk {i}</b> lorem ipsum dolor sit amet. " for i in range(chunks)]
+            if not stream:
+                time.sleep(latency)
+                return text_response("".join(words))
+
+            def parts():
+                for word in words:
+                    time.sleep(latency / chunks)
+                    yield text_response(word)
+            return parts()
+
+    def upload_file(path, mime_type=None):
+        time.sleep(upload_latency)
+        return ns(name=f"files/{next(counter)}", state=ns(name="PROCESSING"), expiration_time=None)
+
+    def get_file(name):
+        return ns(name=name, state=ns(name="ACTIVE"), expiration_time=None)
+
+    module.configure = lambda **kwargs: None
+    module.GenerativeModel = GenerativeModel
+    module.upload_file = upload_file
+    module.get_file = get_file
+    module.delete_file = lambda name: None
+    return module
+
+
+def fake_embed(latency):
+    module = types.ModuleType('embed')
+
+    def embed(prompts, model, tokenizer):
+        time.sleep(latency)
+        vectors = []
+        for prompt in prompts:
+            vector = np.random.default_rng(zlib.crc32(prompt.encode())).normal(size=EMBED_DIM)
+            vectors.append(vector / np.linalg.norm(vector))
+        return vectors
+
+    module.embed = embed
+    module.get_model_and_tokenizer = lambda **kwargs: (None, None)
+    return module
+
+
+def fake_pinecone():
+    module = types.ModuleType('pinecone')
+
+    class Pinecone:
+        def __init__(self, **kwargs):
+            raise RuntimeError("the benchmark uses PINECONE_SNAPSHOT")
+
+    module.Pinecone = Pinecone
+    return module
+
+
+class FakeGoogleGeocoder:
+    def __init__(self, latency, zips):
+        self.latency = latency
+        self.zips = zips
+
+    def lookup(self, latitude, longitude):
+        time.sleep(self.latency)
+        return "Florida", "Hillsborough County", self.zips[int(abs(latitude * 1000 + longitude * 100)) % len(self.zips)]
+
+
+def install_fakes(args, gif_url):
+    google = types.ModuleType('google')
+    genai = fake_genai(args.llm_latency, args.upload_latency)
+    google.generativeai = genai
+    sys.modules.update({
+        'sat': fake_sat(gif_url, args.ee_latency),
+        'google': google,
+        'google.generativeai': genai,
+        'embed': fake_embed(args.embed_latency),
+        'pinecone': fake_pinecone(),
+    })
+
+
+# Scratch directory with the synthetic HURDAT2 file, the insurance table,
+# ZIP centroids over the query area and an article index snapshot
+def prepare_workdir(workdir, storms, args):
+    synthetic_hurdat2(os.path.join(workdir, 'hurdat2.txt'), storms)
+    shutil.copy('insurance_data.csv', workdir)
+    import pandas as pd
+    zips = pd.read_csv('insurance_data.csv', dtype={'ZIP code': str})
+    zips = zips[zips['State'] == 'Florida']['ZIP code'].tolist() or ['33592']
+    rng = np.random.default_rng(1)
+    if not args.geocode_latency:
+        pd.DataFrame({
+            'zip': zips, 'state': 'Florida', 'county': 'Hillsborough County',
+            'lat': rng.uniform(*LAT_RANGE, len(zips)), 'lng': rng.uniform(*LNG_RANGE, len(zips)),
+        }).to_csv(os.path.join(workdir, 'zip_centroids.csv'), index=False)
+
+    from pc import LocalIndex
+    articles = 2000
+    vectors = rng.normal(size=(articles, EMBED_DIM)).astype(np.float32)
+    metadata = [{'url': f"https://news.example/{i}",
+                 'content': f"Article {i} on hurricane damage.\n\n" + "Storm surge and insurance costs. " * int(rng.integers(20, 200))}
+                for i in range(articles)]
+    LocalIndex([str(i) for i in range(articles)], vectors, metadata).save(os.path.join(workdir, 'articles.npz'))
+    return zips
+
+
+def percentile(latencies, q):
+    return float(np.percentile(latencies, q) * 1000) if latencies else float('nan')
+
+
+# Send `total` POSTs to `url` from `concurrency` threads; bodies cycle
+def run_load(url, bodies, concurrency, total):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        data = json.dumps(bodies[i % len(bodies)]).encode()
+        request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                response.read()
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    return {'rps': len(latencies) / elapsed, 'p50_ms': percentile(latencies, 50),
+            'p99_ms': percentile(latencies, 99), 'errors': errors}
+
+
+def worker(args):
+    gif_server, gif_url = serve_bytes(canned_gif(), args.gif_latency)
+    install_fakes(args, gif_url)
+    backend = os.getcwd()
+    sys.path.insert(0, backend)
+    workdir = tempfile.mkdtemp(prefix='bench_backend_')
+    try:
+        zips = prepare_workdir(workdir, args.size, args)
+        os.chdir(workdir)
+        os.environ['PINECONE_SNAPSHOT'] = os.path.join(workdir, 'articles.npz')
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        # The GIF server thread is already running, so main must not fork a
+        # portfolio pool (see portfolio.py)
+        os.environ['PORTFOLIO_WORKERS'] = '0'
+
+        start = time.perf_counter()
+        import main
+        startup = time.perf_counter() - start
+        if args.geocode_latency:
+            main.zip_centroids = None
+        main.google_geocoder = FakeGoogleGeocoder(args.geocode_latency, zips)
+
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, main.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        rng = np.random.default_rng(2)
+        def points(n):
+            return [{'lat': float(lat), 'lng': float(lng)}
+                    for lat, lng in zip(rng.uniform(*LAT_RANGE, n), rng.uniform(*LNG_RANGE, n))]
+
+        results = []
+        for concurrency in args.concurrency:
+            results.append(('/find_hurricanes', concurrency,
+                            run_load(base + '/find_hurricanes', points(200), concurrency, args.requests)))
+            # Distinct cells, so every request misses the analysis cache
+            cold = points(args.analysis_requests)
+            results.append(('/analysis cold', concurrency,
+                            run_load(base + '/analysis', cold, concurrency, len(cold))))
+            results.append(('/analysis cached', concurrency,
+                            run_load(base + '/analysis', cold[:8], concurrency, args.analysis_requests)))
+        server.shutdown()
+        gif_server.shutdown()
+        print(json.dumps({'size': args.size, 'startup_s': startup,
+                          'rows': len(main.storm_data.df), 'results': results}))
+    finally:
+        os.chdir(backend)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the backend")
+    parser.add_argument('--sizes', default='500,2000,8000', help="storms per synthetic HURDAT2 file")
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--requests', type=int, default=500, help="/find_hurricanes requests per level")
+    parser.add_argument('--analysis-requests', type=int, default=64, help="/analysis requests per level")
+    parser.add_argument('--llm-latency', type=float, default=1.0)
+    parser.add_argument('--upload-latency', type=float, default=0.3)
+    parser.add_argument('--embed-latency', type=float, default=0.02)
+    parser.add_argument('--ee-latency', type=float, default=0.3)
+    parser.add_argument('--gif-latency', type=float, default=0.2)
+    parser.add_argument('--geocode-latency', type=float, default=0.0,
+                        help="use a fake Google geocoder with this latency instead of ZIP centroids")
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(',')]
+
+    if args.size is not None:
+        worker(args)
+        return
+
+    # Every option but --sizes, rebuilt from the parsed values
+    passthrough = ['--concurrency', ','.join(map(str, args.concurrency))]
+    for name in ('requests', 'analysis_requests', 'llm_latency', 'upload_latency', 'embed_latency',
+                 'ee_latency', 'gif_latency', 'geocode_latency'):
+        passthrough += ['--' + name.replace('_', '-'), str(getattr(args, name))]
+    for size in (int(s) for s in args.sizes.split(',')):
+        out = subprocess.run([sys.executable, __file__, '--size', str(size)] + passthrough,
+                             capture_output=True, text=True)
+        if out.returncode:
+            print(out.stderr)
+            continue
+        report = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"\n{size} storms ({report['rows']} fixes in window), startup {report['startup_s']:.1f}s")
+        print(f"{'endpoint':<20}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for endpoint, concurrency, r in report['results']:
+            print(f"{endpoint:<20}{concurrency:>6}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
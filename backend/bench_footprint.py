@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from tracks import TrackArrays
+from spatial import GridIndex
+from footprint import FootprintIndex, RADII_COLS
+from bench_intersect import timeit
+
+# Compare the quadrant-aware segment footprints against the fix-only radius
+# test, in query time and in storms found.
+# Run from backend/: python bench_footprint.py
+
+
+def synthetic_storms(storms, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for s in range(storms):
+        n = int(rng.integers(8, 60))
+        step_lat = rng.uniform(0.1, 1.2, n)
+        step_lon = rng.uniform(-2.0, 0.5, n)
+        radii = rng.choice([0, 30, 60, 90, 150, 200], size=(n, len(RADII_COLS))).astype('float64')
+        radii[:, 4:] = np.minimum(radii[:, 4:], radii[:, :8]) / 2
+        frame = pd.DataFrame(radii, columns=RADII_COLS)
+        frame.insert(0, 'Id', f"AL{s:06d}")
+        frame.insert(1, 'Lat', rng.uniform(12, 30) + np.cumsum(step_lat))
+        frame.insert(2, 'Lon', rng.uniform(-90, -40) + np.cumsum(step_lon))
+        frame['MaxWind'] = rng.integers(30, 160, n).astype('float64')
+        mx = frame[RADII_COLS].max(axis=1)
+        frame['MaxRadius_km'] = np.where(mx < 10, 260.0, mx) * 1.852
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(1)
+    targets = list(zip(rng.uniform(18, 40, 200), rng.uniform(-95, -45, 200)))
+    for storms in (300, 1000, 3000):
+        df = synthetic_storms(storms)
+        points = GridIndex(TrackArrays.from_df(df))
+        footprints = FootprintIndex(df)
+
+        point_ms = timeit(lambda: [points.intersect(lat, lon) for lat, lon in targets], 5) / len(targets)
+        segment_ms = timeit(lambda: [footprints.intersect(lat, lon) for lat, lon in targets], 5) / len(targets)
+
+        ids = df['Id'].to_numpy()
+        point_storms = segment_storms = 0
+        for lat, lon in targets:
+            point_storms += len(set(ids[points.intersect(lat, lon)[0]]))
+            segment_storms += len(set(ids[footprints.intersect(lat, lon)[0]]))
+        print(f"{len(df):>7} fixes  point test {point_ms:6.3f} ms/query ({point_storms} storm hits)"
+              f"  footprints {segment_ms:6.3f} ms/query ({segment_storms} storm hits)")
@@ -0,0 +1,209 @@
+import os
+import sys
+
+import numpy as np
+
+from hurdat import load_hurdat
+from array_store import ArrayStore
+from exposure_grid import CELL_DEG, LAT_RANGE, LON_RANGE, CHUNK_FIXES, cell_index, chunk_pairs, haversine
+
+# Historical storm climatology per grid cell, for risk scoring.
+#
+# Built from the whole HURDAT2 record rather than the serving window. A storm
+# counts for a cell when its centre passed within RADIUS_KM (50 nmi, the
+# usual radius for historical hurricane strikes) of the cell centre, at the
+# Saffir-Simpson category of its highest wind while it was that close. Tracks
+# are interpolated linearly between fixes to points at most STEP_KM apart,
+# so fast storms do not skip cells between their 6-hourly fixes.
+#
+# Per cell it keeps storm counts by category, the highest wind and storm
+# counts per decade as dense arrays indexed by cell, so a lookup is a few
+# array reads. They are saved as memory-mappable .npy files under
+# CLIMATOLOGY_DIR by an ArrayStore (see array_store.py), like the exposure grid.
+#
+# Return periods are the record length over the number of storms at or above
+# a category. The trend is the least-squares slope of storms per decade over
+# the last TREND_DECADES complete decades. Pre-satellite decades undercount
+# storms, especially weak ones, so early decades and return periods of
+# tropical storms lean low.
+#
+# Build ahead of deploys with: python climatology.py [hurdat2.txt]
+
+CLIMATOLOGY_DIR = 'climatology'
+CLIMATOLOGY_VERSION = 1
+RADIUS_KM = 50 * 1.852
+STEP_KM = 10.0
+# Lower bounds in kt of a tropical storm and of categories 1-5
+CATEGORY_KT = (34, 64, 83, 96, 113, 137)
+CATEGORY_NAMES = ('tropicalStorm', 'category1', 'category2', 'category3', 'category4', 'category5')
+# Return periods reported, by the lowest category they include
+RETURN_PERIODS = {'tropicalStorm': 0, 'hurricane': 1, 'majorHurricane': 3}
+TREND_DECADES = 6
+
+CLIMATOLOGY_ARRAYS = ('categories', 'decades', 'max_wind')
+
+# (lat, lon, wind, storm) of points along every track, at most STEP_KM apart
+def track_points(df):
+    codes = df['Id'].to_numpy()
+    lat = df['Lat'].to_numpy(dtype=np.float64)
+    lon = df['Lon'].to_numpy(dtype=np.float64)
+    wind = df['MaxWind'].to_numpy(dtype=np.float64)
+    wind = np.where(wind >= 0, wind, np.nan)
+    storm = np.cumsum(np.r_[True, codes[1:] != codes[:-1]]) - 1 if len(codes) else np.empty(0, np.int64)
+
+    # Points per fix: itself plus the interpolated ones up to the next fix
+    same = storm[1:] == storm[:-1]
+    gap = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    steps = np.r_[np.where(same, np.maximum(np.ceil(gap / STEP_KM), 1), 1), 1][:len(codes)].astype(np.int64)
+    fix = np.repeat(np.arange(len(codes)), steps)
+    frac = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[fix]
+    nxt = np.where(np.r_[same, False][fix], fix + 1, fix)
+
+    def along(values):
+        return values[fix] + (values[nxt] - values[fix]) * frac
+    # Between a fix with wind and one without, take the known wind
+    point_wind = along(wind)
+    point_wind = np.where(np.isnan(point_wind), np.fmax(wind[fix], wind[nxt]), point_wind)
+    return along(lat), along(lon), point_wind, storm[fix]
+
+# Build the climatology arrays from the full table returned by hurdat.load_hurdat
+def build_climatology(df):
+    nrows = int(round((LAT_RANGE[1] - LAT_RANGE[0]) / CELL_DEG))
+    ncols = int(round((LON_RANGE[1] - LON_RANGE[0]) / CELL_DEG))
+    ncells = nrows * ncols
+    codes = df['Id'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, np.int64)
+    # Storm ids end in the season, e.g. AL092017
+    years = np.array([int(str(storm_id)[-4:]) for storm_id in codes[starts]], dtype=np.int64)
+    first_year = int(years.min()) if len(years) else 0
+    last_year = int(years.max()) if len(years) else 0
+    first_decade = first_year // 10 * 10
+    ndecades = (last_year - first_decade) // 10 + 1 if len(years) else 0
+
+    lat, lon, wind, storm = track_points(df)
+    radius = np.full(len(lat), RADIUS_KM)
+    keys, winds = [], []
+    for a in range(0, len(lat), CHUNK_FIXES * 4):
+        b = a + CHUNK_FIXES * 4
+        cell, s, dist, w = chunk_pairs(lat[a:b], lon[a:b], radius[a:b], wind[a:b], storm[a:b], nrows, ncols)
+        close = (dist <= RADIUS_KM) & ~np.isnan(w)
+        key = cell[close] * max(len(years), 1) + s[close]
+        w = w[close]
+        order = np.argsort(key, kind='stable')
+        key, w = key[order], w[order]
+        first = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else np.empty(0, np.int64)
+        keys.append(key[first])
+        winds.append(np.maximum.reduceat(w, first) if len(first) else w[:0])
+
+    # Highest wind per (cell, storm); a storm can span chunks
+    key = np.concatenate(keys) if keys else np.empty(0, np.int64)
+    wind = np.concatenate(winds) if winds else np.empty(0)
+    order = np.argsort(key, kind='stable')
+    key, wind = key[order], wind[order]
+    first = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else np.empty(0, np.int64)
+    key, wind = key[first], (np.maximum.reduceat(wind, first) if len(first) else wind)
+    cell, storm = key // max(len(years), 1), key % max(len(years), 1)
+
+    category = np.searchsorted(CATEGORY_KT, wind, side='right') - 1
+    keep = category >= 0
+    cell, storm, category, wind = cell[keep], storm[keep], category[keep], wind[keep]
+    decade = (years[storm] - first_decade) // 10
+
+    ncat = len(CATEGORY_KT)
+    max_wind = np.full(ncells, np.nan, dtype=np.float32)
+    if len(cell):
+        # `cell` is sorted
+        bounds = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+        max_wind[cell[bounds]] = np.maximum.reduceat(wind, bounds)
+    return {
+        'categories': np.bincount(cell * ncat + category, minlength=ncells * ncat).astype(np.uint16).reshape(ncells, ncat),
+        'decades': np.bincount(cell * ndecades + decade, minlength=ncells * ndecades).astype(np.uint16).reshape(ncells, ndecades),
+        'max_wind': max_wind,
+        'shape': (nrows, ncols),
+        'years': (first_year, last_year) if len(years) else None,
+    }
+
+climatology_store = ArrayStore(CLIMATOLOGY_ARRAYS, f"-v{CLIMATOLOGY_VERSION}-{CELL_DEG:g}",
+                               lambda path: build_climatology(load_hurdat(path)),
+                               meta={'cell_deg': CELL_DEG, 'radius_km': RADIUS_KM})
+
+def climatology_path(path, climatology_dir=CLIMATOLOGY_DIR):
+    return climatology_store.path(path, climatology_dir)
+
+# Climatology for `path`, built from the full record and saved first when
+# missing. With build=False one from an earlier release (or None) is
+# returned instead, leaving the build to the caller.
+def load_climatology(path='hurdat2.txt', climatology_dir=CLIMATOLOGY_DIR, build=True):
+    arrays = climatology_store.load(path, climatology_dir, build)
+    return Climatology(arrays) if arrays is not None else None
+
+class Climatology:
+    def __init__(self, arrays):
+        self.nrows, self.ncols = arrays['shape']
+        self.categories = arrays['categories']
+        self.decades = arrays['decades']
+        self.max_wind = arrays['max_wind']
+        self.first_year, self.last_year = arrays['years'] or (None, None)
+        self.first_decade = self.first_year // 10 * 10 if self.first_year is not None else 0
+
+    # Least-squares storms per decade change over the last complete decades
+    def trend(self, decades):
+        complete = (self.last_year + 1 - self.first_decade) // 10
+        counts = decades[:complete][-TREND_DECADES:]
+        if len(counts) < 2:
+            return None
+        return round(float(np.polyfit(np.arange(len(counts)), counts, 1)[0]), 2)
+
+    # Summary for the cell containing the point, or None outside the grid
+    def at(self, lat, lon):
+        cell = cell_index(lat, lon, self.nrows, self.ncols)
+        if cell is None or self.first_year is None:
+            return None
+        counts = self.categories[cell].astype(np.int64)
+        at_least = np.cumsum(counts[::-1])[::-1]
+        record_years = self.last_year - self.first_year + 1
+        decades = self.decades[cell].astype(np.int64)
+        row, col = divmod(cell, self.ncols)
+        max_wind = self.max_wind[cell]
+        return {
+            'cell': {'lat': LAT_RANGE[0] + (row + 0.5) * CELL_DEG, 'lng': LON_RANGE[0] + (col + 0.5) * CELL_DEG,
+                     'sizeDeg': CELL_DEG},
+            'years': [self.first_year, self.last_year],
+            'radiusNmi': round(RADIUS_KM / 1.852, 1),
+            'storms': int(at_least[0]),
+            'categories': dict(zip(CATEGORY_NAMES, counts.tolist())),
+            'maxWind': None if np.isnan(max_wind) else float(max_wind),
+            'returnPeriodYears': {name: round(record_years / int(at_least[i]), 1) if at_least[i] else None
+                                  for name, i in RETURN_PERIODS.items()},
+            'decades': {f"{self.first_decade + 10 * i}s": n for i, n in enumerate(decades.tolist())},
+            'trendPerDecade': self.trend(decades),
+        }
+
+# Plain-text summary for the Gemini prompt
+def describe(summary):
+    if summary is None:
+        return ""
+    first, last = summary['years']
+    counts = summary['categories']
+    hurricanes = summary['storms'] - counts['tropicalStorm']
+    major = counts['category3'] + counts['category4'] + counts['category5']
+    text = (f"Historical storm record for this location (NOAA HURDAT2 best tracks {first}-{last}, "
+            f"{summary['cell']['sizeDeg']:g} degree grid cell): {summary['storms']} tropical storms and hurricanes "
+            f"passed within {summary['radiusNmi']:g} nautical miles, {hurricanes} of them at hurricane strength and "
+            f"{major} as major hurricanes (category 3 or stronger) while that close.")
+    if summary['maxWind'] is not None:
+        text += f" Strongest sustained wind of a storm that close: {summary['maxWind']:.0f} kt."
+    periods = summary['returnPeriodYears']
+    for name, label in (('hurricane', "a hurricane"), ('majorHurricane', "a major hurricane")):
+        if periods[name] is not None:
+            text += f" On average {label} every {periods[name]:g} years."
+    recent = list(summary['decades'].items())[-TREND_DECADES:]
+    text += " Storms per decade: " + ", ".join(f"{decade} {n}" for decade, n in recent) + "."
+    if summary['trendPerDecade'] is not None:
+        text += f" Trend: {summary['trendPerDecade']:+g} storms per decade."
+    return text
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else 'hurdat2.txt'
+    os.makedirs(CLIMATOLOGY_DIR, exist_ok=True)
+    print(climatology_store.save(build_climatology(load_hurdat(source)), climatology_path(source)))
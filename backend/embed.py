@@ -1,27 +1,152 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+import os
+import threading
+
+import torch
 from transformers import AutoTokenizer, AutoModel
 import torch.nn.functional as F
 from torch import Tensor
 
+MODEL_NAME = 'intfloat/multilingual-e5-large'
+ONNX_DIR = 'e5_onnx'
+
+# Prompts used to compare a fast backend against the fp32 model
+PARITY_PROMPTS = [
+    "News about hurricanes, hurricane damage, hurricane preparedness, sea level rise, property values in Miami-Dade County, Florida at zip code 33139",
+    "News about hurricanes, hurricane damage, hurricane preparedness, sea level rise, property values in Harris County, Texas at zip code 77002",
+    "Storm surge flooded coastal neighborhoods and insurers raised premiums.",
+]
+
+# Embeddings of recently seen prompts, most recently used last
+CACHE_SIZE = 4096
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
 def average_pool(last_hidden_states: Tensor,
                  attention_mask: Tensor) -> Tensor:
     last_hidden = last_hidden_states.masked_fill(~attention_mask[..., None].bool(), 0.0)
     return last_hidden.sum(dim=1) / attention_mask.sum(dim=1)[..., None]
 
-def get_model_and_tokenizer():
-    tokenizer = AutoTokenizer.from_pretrained('intfloat/multilingual-e5-large')
-    model = AutoModel.from_pretrained('intfloat/multilingual-e5-large')
-    return model, tokenizer
+# ONNX Runtime session with the same call signature as the transformers model
+class OnnxEncoder:
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
 
-def embed(prompts, model, tokenizer):
-    tokenizer = AutoTokenizer.from_pretrained('intfloat/multilingual-e5-large')
-    model = AutoModel.from_pretrained('intfloat/multilingual-e5-large')
+    def eval(self):
+        return self
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        feed = {'input_ids': input_ids.numpy(), 'attention_mask': attention_mask.numpy()}
+        hidden = self.session.run(['last_hidden_state'], feed)[0]
+        return SimpleNamespace(last_hidden_state=torch.from_numpy(hidden))
+
+# Export the fp32 model to ONNX_DIR once (optionally int8-quantized) and return the file
+def export_onnx(model, tokenizer, quantize=False):
+    path = os.path.join(ONNX_DIR, 'model.onnx')
+    if not os.path.exists(path):
+        os.makedirs(ONNX_DIR, exist_ok=True)
+        sample = tokenizer(PARITY_PROMPTS[:1], return_tensors='pt')
+        dynamic = {0: 'batch', 1: 'sequence'}
+        torch.onnx.export(model, (sample['input_ids'], sample['attention_mask']), path,
+                          input_names=['input_ids', 'attention_mask'], output_names=['last_hidden_state'],
+                          dynamic_axes={'input_ids': dynamic, 'attention_mask': dynamic, 'last_hidden_state': dynamic},
+                          opset_version=14)
+    if not quantize:
+        return path
+
+    quantized = os.path.join(ONNX_DIR, 'model-int8.onnx')
+    if not os.path.exists(quantized):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(path, quantized, weight_type=QuantType.QInt8)
+    return quantized
+
+# Load the e5 embedder. backend is one of:
+#   'torch'      fp32 transformers model
+#   'int8'       torch dynamic int8 quantization of the Linear layers
+#   'onnx'       fp32 ONNX Runtime session
+#   'onnx-int8'  int8-quantized ONNX Runtime session
+# threads caps intra-op CPU threads; verify checks cosine parity with fp32.
+def get_model_and_tokenizer(backend='torch', threads=None, verify=False):
+    if threads:
+        torch.set_num_threads(threads)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+
+    onnx_file = os.path.join(ONNX_DIR, 'model-int8.onnx' if backend == 'onnx-int8' else 'model.onnx')
+    model = None
+    if backend not in ('onnx', 'onnx-int8') or verify or not os.path.exists(onnx_file):
+        model = AutoModel.from_pretrained(MODEL_NAME)
+        model.eval()
 
+    if backend == 'torch':
+        return model, tokenizer
+    if backend == 'int8':
+        fast = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend in ('onnx', 'onnx-int8'):
+        if not os.path.exists(onnx_file):
+            onnx_file = export_onnx(model, tokenizer, quantize=backend == 'onnx-int8')
+        fast = OnnxEncoder(onnx_file, threads)
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    if verify:
+        check_parity(fast, tokenizer, model)
+    return fast, tokenizer
+
+# Lowest cosine similarity between a backend's embeddings and the fp32 model's
+def check_parity(model, tokenizer, reference, threshold=0.99, prompts=PARITY_PROMPTS):
+    fast = embed_batch(prompts, model, tokenizer)
+    exact = embed_batch(prompts, reference, tokenizer)
+    similarity = (fast * exact).sum(dim=1).min().item()
+    if similarity < threshold:
+        raise ValueError(f"Embedding parity {similarity:.4f} below threshold {threshold}")
+    return similarity
+
+# One forward pass over a batch of prompts
+def embed_batch(prompts, model, tokenizer):
     # Tokenize the input texts
     batch_dict = tokenizer(prompts, max_length=512, padding=True, truncation=True, return_tensors='pt')
 
-    outputs = model(**batch_dict)
-    embeddings = average_pool(outputs.last_hidden_state, batch_dict['attention_mask'])
+    with torch.inference_mode():
+        outputs = model(**batch_dict)
+        embeddings = average_pool(outputs.last_hidden_state, batch_dict['attention_mask'])
+
+        # normalize embeddings
+        embeddings = F.normalize(embeddings, p=2, dim=1)
+    return embeddings
+
+# Embed prompts with the startup-loaded model, one row per prompt. Prompts
+# already in the LRU cache cost no forward pass; the rest go in one batch.
+def embed(prompts, model, tokenizer):
+    if isinstance(prompts, str):
+        prompts = [prompts]
+
+    rows = [None] * len(prompts)
+    with _cache_lock:
+        for i, prompt in enumerate(prompts):
+            if prompt in _cache:
+                _cache.move_to_end(prompt)
+                rows[i] = _cache[prompt]
+
+    missing = list(dict.fromkeys(p for p, row in zip(prompts, rows) if row is None))
+    if missing:
+        fresh = dict(zip(missing, embed_batch(missing, model, tokenizer)))
+        with _cache_lock:
+            for prompt, row in fresh.items():
+                _cache[prompt] = row
+                _cache.move_to_end(prompt)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+        rows = [fresh[p] if row is None else row for p, row in zip(prompts, rows)]
+
+    return torch.stack(rows)
 
-    # normalize embeddings
-    embeddings = F.normalize(embeddings, p=2, dim=1)
-    return embeddings[0]
\ No newline at end of file
+if __name__ == "__main__":
+    import sys
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'onnx-int8'
+    model, tokenizer = get_model_and_tokenizer(backend, verify=True)
+    print(backend, "parity ok")
@@ -0,0 +1,150 @@
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+# Embedding inference in dedicated processes, shared by all HTTP workers.
+#
+# serve_embeddings() loads the e5 model once and listens on a Unix socket.
+# Requests from every connected worker go into one queue; a batcher takes
+# whatever arrived within MAX_WAIT seconds of the first request (up to
+# MAX_BATCH prompts) and embeds it in a single forward pass, so concurrent
+# lookups from different HTTP workers share the model's batch throughput
+# instead of each process holding its own copy of the model.
+#
+# EmbedClient is the HTTP worker side: one connection per inference process
+# (reopened after a fork), requests spread round-robin, and a reader thread
+# per connection resolving each caller's future, so any number of threads can
+# wait on it at once. The listener starts before the model loads, so requests
+# sent during startup wait for it instead of failing.
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 32
+# Seconds to wait for more requests to join a batch
+MAX_WAIT = 0.005
+# Seconds a caller waits for its embedding
+TIMEOUT = 120.0
+
+def serve_embeddings(address, authkey, backend='torch', threads=None, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+    listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    pending = queue.Queue()
+
+    def read(conn):
+        send_lock = threading.Lock()
+        try:
+            while True:
+                request_id, prompts = conn.recv()
+                pending.put((conn, send_lock, request_id, prompts))
+        except (EOFError, OSError):
+            conn.close()
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                logger.exception("embedding connection failed")
+                continue
+            threading.Thread(target=read, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+
+    from embed import get_model_and_tokenizer, embed
+    model, tokenizer = get_model_and_tokenizer(backend=backend, threads=threads)
+    logger.info("embedding worker ready address=%s backend=%s", address, backend)
+
+    while True:
+        batch = [pending.get()]
+        size = len(batch[0][3])
+        deadline = time.monotonic() + max_wait
+        while size < max_batch:
+            try:
+                item = pending.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[3])
+
+        prompts = [prompt for *_, item_prompts in batch for prompt in item_prompts]
+        try:
+            vectors, error = embed(prompts, model, tokenizer).numpy(), None
+        except Exception as e:
+            logger.exception("embedding batch of %d failed", len(prompts))
+            vectors, error = None, repr(e)
+
+        offset = 0
+        for conn, send_lock, request_id, item_prompts in batch:
+            rows = vectors[offset:offset + len(item_prompts)] if vectors is not None else None
+            offset += len(item_prompts)
+            try:
+                with send_lock:
+                    conn.send((request_id, rows, error))
+            except OSError:
+                pass  # worker went away
+
+class EmbedClient:
+    def __init__(self, addresses, authkey, timeout=TIMEOUT):
+        self.addresses = list(addresses)
+        self.authkey = authkey
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.connections = None
+        self.pid = None
+        self.futures = {}
+        self.ids = itertools.count()
+
+    def _connections(self):
+        if self.connections is None or self.pid != os.getpid():
+            self.connections = [(Client(address, family='AF_UNIX', authkey=self.authkey), threading.Lock())
+                                for address in self.addresses]
+            self.pid = os.getpid()
+            self.futures = {}
+            for conn, _ in self.connections:
+                threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+        return self.connections
+
+    def _read(self, conn):
+        try:
+            while True:
+                request_id, rows, error = conn.recv()
+                with self.lock:
+                    future = self.futures.pop(request_id, None)
+                if future is None:
+                    continue
+                if error is not None:
+                    future.set_exception(RuntimeError(f"embedding failed: {error}"))
+                else:
+                    future.set_result(rows)
+        except (EOFError, OSError):
+            # Fail everything in flight and reconnect on the next call
+            with self.lock:
+                if self.connections is not None and any(c is conn for c, _ in self.connections):
+                    self.connections = None
+                    futures, self.futures = self.futures, {}
+                else:
+                    futures = {}
+            for future in futures.values():
+                future.set_exception(ConnectionError("embedding worker disconnected"))
+
+    # One row per prompt, like embed.embed
+    def embed(self, prompts):
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        future = Future()
+        with self.lock:
+            connections = self._connections()
+            request_id = next(self.ids)
+            self.futures[request_id] = future
+            conn, send_lock = connections[request_id % len(connections)]
+        try:
+            with send_lock:
+                conn.send((request_id, list(prompts)))
+            return future.result(timeout=self.timeout)
+        finally:
+            with self.lock:
+                self.futures.pop(request_id, None)
@@ -0,0 +1,194 @@
+import os
+import sys
+
+import numpy as np
+
+from hurdat import load_hurdat
+from array_store import ArrayStore
+from tracks import EARTH_RADIUS_KM
+from spatial import KM_PER_DEG
+
+# Precomputed hurricane exposure grid over the Atlantic basin.
+#
+# For every CELL_DEG cell the grid stores the storms whose MaxRadius_km
+# footprint around any fix reaches the cell, with the smallest fix-to-centre
+# distance and the storm's max wind among those fixes. It is stored CSR-style
+# as memory-mappable .npy files: `offsets` (ncells + 1) into the per-pair
+# arrays `storms` (index into `ids`), `min_distance_km` and `max_wind`.
+#
+# A cell lists a storm when some fix is within radius + half the cell diagonal
+# of its centre, so the list is a superset of the storms that can reach any
+# point in the cell. Queries then refine exactly over those storms' fixes.
+#
+# A grid built for an older HURDAT2 release stays usable after new storms are
+# ingested: storms that are missing from it, or whose fix count changed, are
+# refined for every query until the grid is rebuilt.
+#
+# Build ahead of deploys with: python exposure_grid.py [hurdat2.txt]
+
+GRID_DIR = 'exposure_grid'
+GRID_VERSION = 2
+CELL_DEG = 0.25
+LAT_RANGE = (0.0, 75.0)
+LON_RANGE = (-120.0, 20.0)
+# Fixes are processed in chunks of whole storms of about this many fixes
+CHUNK_FIXES = 500
+
+GRID_ARRAYS = ('offsets', 'storms', 'min_distance_km', 'max_wind', 'ids', 'counts')
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2.0)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0)**2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+# (cell, storm, distance, wind) for every cell a chunk of fixes reaches
+def chunk_pairs(lat, lon, radius, wind, storm, nrows, ncols):
+    # Conservative half diagonal of a cell plus 1 km for curvature
+    reach = radius + CELL_DEG * KM_PER_DEG * np.sqrt(2) / 2 + 1.0
+    dr = int(np.ceil(reach.max() / KM_PER_DEG / CELL_DEG))
+    max_lat = min(np.abs(lat).max() + dr * CELL_DEG, 89.0)
+    dc = int(np.ceil(reach.max() / (KM_PER_DEG * np.cos(np.radians(max_lat))) / CELL_DEG))
+
+    row = np.floor((lat - LAT_RANGE[0]) / CELL_DEG).astype(np.int64)
+    col = np.floor((lon - LON_RANGE[0]) / CELL_DEG).astype(np.int64)
+    rows = row[:, None, None] + np.arange(-dr, dr + 1)[None, :, None]
+    cols = col[:, None, None] + np.arange(-dc, dc + 1)[None, None, :]
+    rows, cols = np.broadcast_arrays(rows, cols)
+
+    centre_lat = LAT_RANGE[0] + (rows + 0.5) * CELL_DEG
+    centre_lon = LON_RANGE[0] + (cols + 0.5) * CELL_DEG
+    dist = haversine(lat[:, None, None], lon[:, None, None], centre_lat, centre_lon)
+    hit = (dist <= reach[:, None, None]) & (rows >= 0) & (rows < nrows) & (cols >= 0) & (cols < ncols)
+
+    fix = np.broadcast_to(np.arange(len(lat))[:, None, None], hit.shape)[hit]
+    return rows[hit] * ncols + cols[hit], storm[fix], dist[hit], wind[fix]
+
+# Build the grid from the table returned by hurdat.load_hurdat
+def build_grid(df):
+    nrows = int(round((LAT_RANGE[1] - LAT_RANGE[0]) / CELL_DEG))
+    ncols = int(round((LON_RANGE[1] - LON_RANGE[0]) / CELL_DEG))
+    codes = df['Id'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, np.int64)
+    ids = codes[starts].astype(str)
+    storm = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(codes)]))
+
+    lat = df['Lat'].to_numpy(dtype=np.float64)
+    lon = df['Lon'].to_numpy(dtype=np.float64)
+    radius = df['MaxRadius_km'].to_numpy(dtype=np.float64)
+    wind = df['MaxWind'].to_numpy(dtype=np.float64)
+
+    bounds = np.r_[starts[::max(1, len(starts) * CHUNK_FIXES // max(len(codes), 1))], len(codes)]
+    keys, dists, winds = [], [], []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        cell, s, d, w = chunk_pairs(lat[a:b], lon[a:b], radius[a:b], wind[a:b], storm[a:b], nrows, ncols)
+        # Chunks hold whole storms, so (cell, storm) pairs never span chunks
+        key = cell * len(ids) + s
+        order = np.argsort(key, kind='stable')
+        key, d, w = key[order], d[order], w[order]
+        first = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        keys.append(key[first])
+        dists.append(np.minimum.reduceat(d, first) if len(first) else d[:0])
+        winds.append(np.fmax.reduceat(w, first) if len(first) else w[:0])
+
+    key = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    cells = key // max(len(ids), 1)
+    return {
+        'offsets': np.searchsorted(cells, np.arange(nrows * ncols + 1)).astype(np.int64),
+        'storms': (key % max(len(ids), 1)).astype(np.int32),
+        'min_distance_km': np.concatenate(dists)[order].astype(np.float32) if keys else np.empty(0, np.float32),
+        'max_wind': np.concatenate(winds)[order].astype(np.float32) if keys else np.empty(0, np.float32),
+        'ids': ids,
+        'counts': np.diff(np.r_[starts, len(codes)]).astype(np.int64),
+        'shape': (nrows, ncols),
+    }
+
+grid_store = ArrayStore(GRID_ARRAYS, f"-v{GRID_VERSION}-{CELL_DEG:g}", lambda path: build_grid(load_hurdat(path)),
+                        meta={'cell_deg': CELL_DEG, 'lat_range': LAT_RANGE, 'lon_range': LON_RANGE})
+
+def grid_path(path, grid_dir=GRID_DIR):
+    return grid_store.path(path, grid_dir)
+
+# Load the grid for `path`, building and saving it first when missing. With
+# build=False a grid from an earlier release is returned instead (or None),
+# leaving the rebuild to the caller.
+def load_grid(path='hurdat2.txt', grid_dir=GRID_DIR, build=True):
+    return grid_store.load(path, grid_dir, build)
+
+# Cell of the grid (nrows x ncols from LAT_RANGE/LON_RANGE) containing the
+# point, or None outside it
+def cell_index(lat, lon, nrows, ncols):
+    row = int(np.floor((lat - LAT_RANGE[0]) / CELL_DEG))
+    col = int(np.floor((lon - LON_RANGE[0]) / CELL_DEG))
+    if 0 <= row < nrows and 0 <= col < ncols:
+        return row * ncols + col
+    return None
+
+# Exposure lookups against a grid, with exact refinement over a table's fixes.
+# intersect has the same contract as TrackArrays.intersect; points outside
+# the grid fall back to `fallback` (normally the GridIndex).
+class ExposureGrid:
+    def __init__(self, grid, df, tracks, fallback):
+        self.grid = grid
+        self.nrows, self.ncols = grid['shape']
+        self.tracks = tracks
+        self.fallback = fallback
+
+        # Row range of each storm in df; storms' fixes are contiguous
+        codes = df['Id'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, np.int64)
+        stops = np.r_[starts[1:], len(codes)]
+        rows = {str(code): (start, stop) for code, start, stop in zip(codes[starts], starts, stops)}
+        # Per grid storm, its row range in df (empty when outside df's window)
+        self.storm_start = np.zeros(len(grid['ids']), dtype=np.int64)
+        self.storm_stop = np.zeros(len(grid['ids']), dtype=np.int64)
+        counts = dict(zip(grid['ids'].tolist(), grid['counts'].tolist()))
+        for i, storm_id in enumerate(grid['ids']):
+            self.storm_start[i], self.storm_stop[i] = rows.pop(str(storm_id), (0, 0))
+            start, stop = self.storm_start[i], self.storm_stop[i]
+            if stop > start and stop - start != counts[str(storm_id)]:
+                # Revised since the grid was built: refine it everywhere instead
+                rows[str(storm_id)] = (start, stop)
+                self.storm_start[i] = self.storm_stop[i] = 0
+        # Rows of storms the grid does not cover, checked on every query
+        self.extra = np.concatenate([np.arange(start, stop) for start, stop in rows.values()]
+                                    or [np.empty(0, dtype=np.int64)]).astype(np.int64)
+
+    # Slice of the pair arrays for the cell containing the point, or None
+    def cell_slice(self, lat, lon):
+        cell = cell_index(lat, lon, self.nrows, self.ncols)
+        if cell is None:
+            return None
+        return slice(int(self.grid['offsets'][cell]), int(self.grid['offsets'][cell + 1]))
+
+    # (storm ids, min distance to cell centre, max wind) listed for the point's cell
+    def storms_at(self, lat, lon):
+        pairs = self.cell_slice(lat, lon)
+        if pairs is None:
+            return None
+        storms = self.grid['storms'][pairs]
+        return self.grid['ids'][storms], self.grid['min_distance_km'][pairs], self.grid['max_wind'][pairs]
+
+    def intersect(self, target_lat, target_lon):
+        pairs = self.cell_slice(target_lat, target_lon)
+        if pairs is None:
+            return self.fallback.intersect(target_lat, target_lon)
+        storms = np.asarray(self.grid['storms'][pairs])
+        starts, stops = self.storm_start[storms], self.storm_stop[storms]
+        keep = stops > starts
+        starts, stops = starts[keep], stops[keep]
+        order = np.argsort(starts)
+        starts, stops = starts[order], stops[order]
+        lengths = stops - starts
+        idx = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths) + np.arange(lengths.sum())
+        if len(self.extra):
+            idx = np.union1d(idx, self.extra)
+        if not len(idx):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return self.tracks.intersect(target_lat, target_lon, idx)
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else 'hurdat2.txt'
+    os.makedirs(GRID_DIR, exist_ok=True)
+    print(grid_store.save(build_grid(load_hurdat(source)), grid_path(source)))
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from tracks import TrackArrays
+from spatial import GridIndex, KM_PER_DEG
+
+# Quadrant-aware wind footprints swept along interpolated storm tracks.
+#
+# Each pair of consecutive fixes of a storm forms a segment; a storm with a
+# single fix (e.g. the first advisory, or the only one left in the window)
+# forms a zero-length segment at that fix. For a location
+# the segment is tested at its closest approach and at both fixes: the storm
+# centre and the 34/50/64 kt NE/SE/SW/NW radii are linearly interpolated to
+# that point, the quadrant is the bearing from the centre to the location,
+# and the location experienced the highest threshold whose radius in that
+# quadrant reaches it. Fixes without any wind radii (most of the record
+# before 2004) use their symmetric MaxRadius_km circle as a 34 kt footprint.
+# Coordinates and radii are kept once per fix and looked up through each
+# segment's end fixes.
+#
+# Candidate segments come from a GridIndex over segment midpoints, with a
+# reach of half the segment length plus the larger end radius (plus a small
+# margin), so a query
+# only evaluates segments that can possibly touch the location.
+
+THRESHOLDS = (34, 50, 64)
+QUADRANTS = ('NE', 'SE', 'SW', 'NW')
+RADII_COLS = [f"{kt}kt_{q}" for kt in THRESHOLDS for q in QUADRANTS]
+
+class FootprintIndex:
+    def __init__(self, df):
+        codes = df['Id'].to_numpy()
+        same_storm = codes[1:] == codes[:-1] if len(codes) else np.empty(0, dtype=bool)
+        # Fixes that both start and end their storm
+        single = np.flatnonzero(np.r_[True, ~same_storm][:len(codes)] & np.r_[~same_storm, True][:len(codes)])
+        # Segment i runs from fix start[i] to fix end[i]
+        self.start = np.sort(np.r_[np.flatnonzero(same_storm), single])
+        self.end = np.where(np.isin(self.start, single), self.start, self.start + 1)
+        a, b = self.start, self.end
+
+        self.lat = df['Lat'].to_numpy(dtype=np.float64)
+        self.lon = df['Lon'].to_numpy(dtype=np.float64)
+        lat, lon = self.lat, self.lon
+        radii = df[RADII_COLS].to_numpy(dtype=np.float64).reshape(-1, len(THRESHOLDS), len(QUADRANTS))
+        radii = np.where(radii > 0, radii * 1.852, 0.0)
+        no_radii = ~(radii > 0).any(axis=(1, 2))
+        radii[no_radii, 0, :] = df['MaxRadius_km'].to_numpy(dtype=np.float64)[no_radii, None]
+        # (fix, quadrant, threshold), so one quadrant's radii are contiguous
+        self.radii = np.ascontiguousarray(radii.transpose(0, 2, 1))
+
+        fix_radius = self.radii.max(axis=(1, 2)) if len(codes) else np.zeros(0)
+        self.max_radius = np.maximum(fix_radius[a], fix_radius[b])
+
+        mid = TrackArrays((lat[a] + lat[b]) / 2, (lon[a] + lon[b]) / 2, np.zeros(len(a)))
+        # Midpoint to fix a, per segment
+        half = mid.distances(lat[a], lon[a])
+        reach = half + self.max_radius
+        # Margin for the flat-earth frame used when evaluating segments
+        reach = reach * 1.01 + 1.0
+        self.index = GridIndex(TrackArrays(mid.lat, mid.lon, reach))
+
+    def __len__(self):
+        return len(self.start)
+
+    # Segments whose footprint reaches the target: (segment start rows,
+    # closest distance km, highest threshold experienced)
+    def intersect(self, target_lat, target_lon):
+        seg, _ = self.index.intersect(target_lat, target_lon)
+        if not len(seg):
+            return seg, np.empty(0), np.empty(0, dtype=np.int64)
+
+        # Local equirectangular frame in km centred on the target
+        kx = KM_PER_DEG * np.cos(np.radians(target_lat))
+        a, b = self.start[seg], self.end[seg]
+        ax, ay = (self.lon[a] - target_lon) * kx, (self.lat[a] - target_lat) * KM_PER_DEG
+        bx, by = (self.lon[b] - target_lon) * kx, (self.lat[b] - target_lat) * KM_PER_DEG
+        dx, dy = bx - ax, by - ay
+        length2 = dx * dx + dy * dy
+        closest = np.clip(-(ax * dx + ay * dy) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+
+        # Drop segments whose closest approach is beyond every radius they carry
+        near = np.hypot(ax + closest * dx, ay + closest * dy) <= self.max_radius[seg]
+        seg, ax, ay, dx, dy, closest = seg[near], ax[near], ay[near], dx[near], dy[near], closest[near]
+        if not len(seg):
+            return seg, np.empty(0), np.empty(0, dtype=np.int64)
+
+        # Evaluate at fix a, the closest approach and fix b
+        t = np.stack([np.zeros_like(closest), closest, np.ones_like(closest)])
+        px, py = ax + t * dx, ay + t * dy
+        distance = np.hypot(px, py)
+        # Quadrant of the target as seen from the storm centre: NE, SE, SW, NW
+        east, north = px <= 0, py <= 0
+        quadrant = np.where(east, np.where(north, 0, 1), np.where(py > 0, 2, 3))
+
+        # Radii of the quadrant facing the target, interpolated to each point
+        ra = self.radii[np.broadcast_to(self.start[seg], quadrant.shape), quadrant]
+        rb = self.radii[np.broadcast_to(self.end[seg], quadrant.shape), quadrant]
+        radii = ra + t[:, :, None] * (rb - ra)
+        reached = distance[:, :, None] <= radii
+        level = np.where(reached, np.array(THRESHOLDS)[None, None, :], 0).max(axis=2)
+
+        threshold = level.max(axis=0)
+        hit = threshold > 0
+        return self.start[seg[hit]], distance.min(axis=0)[hit], threshold[hit]
+
+    # Per storm: highest threshold experienced at the target and closest distance
+    def storm_exposure(self, df, target_lat, target_lon):
+        rows, distance, threshold = self.intersect(target_lat, target_lon)
+        hits = pd.DataFrame({'Id': df['Id'].to_numpy()[rows], 'Distance_km': distance, 'Threshold_kt': threshold})
+        return (
+            hits.groupby('Id')
+            .agg(Min_Distance_km=('Distance_km', 'min'), Max_Threshold_kt=('Threshold_kt', 'max'))
+            .sort_values(by='Min_Distance_km')
+        )
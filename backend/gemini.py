@@ -1,62 +1,199 @@
+import logging
 import os, time
 
 import requests
 import imageio
-import io
+import tempfile
 
 from sat import ImgSat
+from video_cache import VideoCache
+from metrics import span
 import google.generativeai as genai
-
-
-def upload_sat_img(link):
-
-    response = requests.get(link)
-    response.raise_for_status()
-
-    gif_bytes = io.BytesIO(response.content)
-    gif = imageio.mimread(gif_bytes, format='gif')
-
-
-    video_bytes = io.BytesIO()
-    imageio.mimsave(video_bytes, gif, format='mp4', fps=2)
-    video_bytes.seek(0)
-    
-    response = genai.upload_file(video_bytes, mime_type='video/mp4')
-
-    return response
-
-
-def get_gemini_response(model, isat, lat, long, rag, state, county, zip, cost, per):
-
-    link = isat.query(lat, long)
-    video_file = upload_sat_img(link)
-    
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+
+# Errors Gemini raises for an uploaded file it no longer accepts (deleted,
+# expired or not usable); only these are worth uploading again for
+REJECTED_UPLOAD = (google_exceptions.NotFound, google_exceptions.PermissionDenied,
+                   google_exceptions.FailedPrecondition)
+
+
+# Evicted uploads are deleted remotely. They may be gone already (expired),
+# and a failed delete must not fail the request that evicted them.
+def delete_upload(video_file):
+    try:
+        genai.delete_file(video_file.name)
+    except google_exceptions.NotFound:
+        pass
+    except Exception:
+        logger.warning("deleting %s failed", video_file.name, exc_info=True)
+
+
+# Converted videos and Gemini uploads, shared by every request in the process
+video_cache = VideoCache(on_evict_upload=delete_upload)
+
+
+# Optional cap on the frames kept from a GIF (evenly decimated when the
+# frame count is known) and a fixed keep-every-nth-frame step
+MAX_FRAMES = None
+FRAME_STEP = 1
+
+
+# Download the Landsat GIF and convert it to an MP4 in the cache directory.
+# The GIF is spooled to disk in chunks (the decoder needs to seek) and frames
+# are decoded and handed to the encoder one at a time, so peak memory stays
+# at a frame or two however many scenes the collection returns.
+def convert_sat_img(link, max_frames=MAX_FRAMES, frame_step=FRAME_STEP):
+
+    with tempfile.NamedTemporaryFile(suffix='.gif', dir=video_cache.directory) as gif_file:
+        with span('gif_download'):
+            response = requests.get(link, stream=True, timeout=120)
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                gif_file.write(chunk)
+            gif_file.flush()
+
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp.mp4', dir=video_cache.directory)
+        os.close(fd)
+        try:
+            with span('transcode'), \
+                    imageio.get_reader(gif_file.name, format='gif') as reader, \
+                    imageio.get_writer(tmp_path, format='mp4', fps=2) as writer:
+                step = max(frame_step, 1)
+                frame_count = reader.get_length()
+                if max_frames and frame_count not in (None, float('inf')):
+                    step = max(step, -(-frame_count // max_frames))
+
+                written = 0
+                for i, frame in enumerate(reader):
+                    if i % step:
+                        continue
+                    writer.append_data(frame)
+                    written += 1
+                    if max_frames and written >= max_frames:
+                        break
+        except Exception:
+            os.remove(tmp_path)
+            raise
+    return tmp_path
+
+
+# Gemini deletes uploads after 48 hours
+def upload_expiry(video_file):
+    expiration = getattr(video_file, 'expiration_time', None)
+    if expiration is not None:
+        return expiration.timestamp()
+    return time.time() + 47 * 3600
+
+
+# Render, convert and upload the satellite video for a location. Only needs
+# the coordinates, so it can run while the rest of the analysis is prepared.
+# Keyed on the snapped bbox, a cached upload is reused as is and a cached MP4
+# skips the download and transcode.
+def prepare_video(isat, lat, long):
+    key = VideoCache.key(isat.bbox(lat, long))
+    with span('earth_engine_url'):
+        link = isat.query(lat, long)
+    video_file = video_cache.get_upload(key)
+    if video_file is not None:
+        return link, video_file
+
+    path = video_cache.get_video(key)
+    if path is None:
+        path = video_cache.put_video(key, convert_sat_img(link))
+    with span('gemini_upload'):
+        video_file = genai.upload_file(path, mime_type='video/mp4')
+    with span('gemini_poll'):
+        video_file = wait_until_active(video_file)
+    return link, video_cache.put_upload(key, video_file, upload_expiry(video_file))
+
+
+# Drop a cached upload Gemini rejected and prepare the video again
+def replace_video(isat, lat, long, video_file):
+    video_cache.drop_upload(VideoCache.key(isat.bbox(lat, long)), video_file)
+    return prepare_video(isat, lat, long)
+
+
+# Poll an uploaded file until Gemini has processed it. Short videos are usually
+# ready within a second or two, so polling starts fast and backs off
+# exponentially, giving up once the overall deadline has passed.
+def wait_until_active(video_file, initial=0.5, factor=1.6, max_interval=8.0, deadline=300.0):
+    interval = initial
+    give_up = time.monotonic() + deadline
     while video_file.state.name == "PROCESSING":
-        print('.', end='')
-        time.sleep(10)
+        remaining = give_up - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{video_file.name} still processing after {deadline}s")
+        time.sleep(min(interval, remaining))
+        interval = min(interval * factor, max_interval)
         video_file = genai.get_file(video_file.name)
 
     if video_file.state.name == "FAILED":
         raise ValueError(video_file.state.name)
+    return video_file
+
 
+# Ask Gemini for the analysis. With stream=True, returns a generator of text
+# chunks as they are produced instead of waiting for the full completion.
+def generate_response(video_file, lat, long, rag, state, county, zip, cost, per, stream=False, climate=""):
     # Create the prompt.
     # prompt = "Hurricane damage has been getting much worse in recent years, and it is harder to live with it. Use the given video of satellite imagery and analyze it. Mention attached video showing sattelite imagery at least once."
-    print(lat, long, state, zip, county)
     prompt = f"Analyze what you see in this video. This is satellite imagery at the latitude {lat} and longitude {long}. Mention location details in the state {state}, {county} county, and zip code {zip}. Mention what you see in this video with respect to the coordinates of the location and just talk about how hurricane prone the area is and perhaps average insurance costs in the future + advice to future home buyers in area. Also use documents to back claims. Talk about how the current average cost at this zipcode is ${cost}, which is {per}% above/below the national average. Do not say anything about wanting more data and do not provide links, and style the response so we can embed it as html (bold key terms and such). Make response BRIEF as possible."
 
+    if climate:
+        prompt += f" Use these historical storm statistics for the location to quantify the risk: {climate}"
+
     # Choose a Gemini model.
     model = genai.GenerativeModel(model_name="models/gemini-1.5-flash")
 
-    # Debugging output
-    print("Prompt:", prompt)
-    print("Video File:", video_file)  # Adjust based on actual attributes
-    print("RAG:", rag)
+    logger.debug("gemini request lat=%s lng=%s state=%s county=%s zip=%s video=%s rag_chars=%d prompt=%r",
+                 lat, long, state, county, zip, getattr(video_file, 'name', video_file), len(rag), prompt)
 
     # Make the LLM request.
-    print("Making LLM inference request...")
-    response = model.generate_content([video_file, rag, prompt],  # Ensure correct attribute
-                                       request_options={"timeout": 600})
-   
-    print(response)
-    genai.delete_file(video_file.name)
-    return link, response.candidates[0].content.parts[0].text
+    if stream:
+        return stream_response(model, [video_file, rag, prompt])
+    with span('gemini_generate'):
+        response = model.generate_content([video_file, rag, prompt],  # Ensure correct attribute
+                                           request_options={"timeout": 600})
+    return response.candidates[0].content.parts[0].text
+
+
+def stream_response(model, contents):
+    with span('gemini_generate'):
+        response = model.generate_content(contents, stream=True, request_options={"timeout": 600})
+        for chunk in response:
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield chunk.candidates[0].content.parts[0].text
+
+
+# generate_response that, when Gemini rejects the uploaded file (a cached
+# upload it has deleted or expired early, see REJECTED_UPLOAD), drops the
+# upload, uploads the video again and retries once. Other failures (timeouts,
+# quota, network) are raised as is. A stream is only retried before its
+# first chunk.
+def generate_response_retrying(isat, video_file, lat, long, *args, stream=False, **kwargs):
+    if stream:
+        return _stream_retrying(isat, video_file, lat, long, args, kwargs)
+    try:
+        return generate_response(video_file, lat, long, *args, **kwargs)
+    except REJECTED_UPLOAD:
+        logger.warning("Gemini rejected %s, uploading again", video_file.name, exc_info=True)
+        _, video_file = replace_video(isat, lat, long, video_file)
+        return generate_response(video_file, lat, long, *args, **kwargs)
+
+
+def _stream_retrying(isat, video_file, lat, long, args, kwargs):
+    for attempt in range(2):
+        started = False
+        try:
+            for text in generate_response(video_file, lat, long, *args, stream=True, **kwargs):
+                started = True
+                yield text
+            return
+        except REJECTED_UPLOAD:
+            if started or attempt:
+                raise
+            logger.warning("Gemini rejected %s, uploading again", video_file.name, exc_info=True)
+            _, video_file = replace_video(isat, lat, long, video_file)
@@ -0,0 +1,129 @@
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from tracks import TrackArrays
+from spatial import GridIndex
+from response_cache import snap
+
+# Reverse geocoding of a location to (state, county, zip).
+#
+# CentroidIndex answers offline from a table of ZIP centroids, CENTROIDS_PATH,
+# a CSV with columns zip, state, county, lat, lng, where state and county are
+# spelled like Google's long names ("Florida", "Hillsborough County"). A
+# location resolves to the nearest centroid within OFFLINE_MAX_KM, found with
+# a GridIndex. Farther from any centroid (offshore, or areas the table does
+# not cover) GoogleGeocoder is used instead: it keeps one pooled HTTP session,
+# applies a timeout and caches results in an LRU keyed by the coordinates
+# snapped to SNAP_DEG.
+#
+# The centroid table is built from Census data: ZCTA internal points from the
+# gazetteer, and each ZCTA's county (the one holding most of its land) and
+# state from the ZCTA-to-county relationship file. Build it ahead of deploys
+# with: python geocoder.py [gazetteer.zip|.txt relationship.txt]
+# (downloaded from census.gov when not given).
+
+CENTROIDS_PATH = 'zip_centroids.csv'
+OFFLINE_MAX_KM = 10.0
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+# Seconds to connect / read
+TIMEOUT = (3.05, 10.0)
+SNAP_DEG = 0.01
+CACHE_SIZE = 8192
+
+GAZETTEER_URL = "https://www2.census.gov/geo/docs/maps-data/data/gazetteer/2023_Gazetteer/2023_Gaz_zcta_national.zip"
+RELATIONSHIP_URL = "https://www2.census.gov/geo/docs/maps-data/data/rel2020/zcta520/tab20_zcta520_county20_natl.txt"
+# State names by FIPS code, spelled like Google's long names
+STATE_FIPS = {
+    '01': 'Alabama', '02': 'Alaska', '04': 'Arizona', '05': 'Arkansas', '06': 'California', '08': 'Colorado',
+    '09': 'Connecticut', '10': 'Delaware', '11': 'District of Columbia', '12': 'Florida', '13': 'Georgia',
+    '15': 'Hawaii', '16': 'Idaho', '17': 'Illinois', '18': 'Indiana', '19': 'Iowa', '20': 'Kansas',
+    '21': 'Kentucky', '22': 'Louisiana', '23': 'Maine', '24': 'Maryland', '25': 'Massachusetts',
+    '26': 'Michigan', '27': 'Minnesota', '28': 'Mississippi', '29': 'Missouri', '30': 'Montana',
+    '31': 'Nebraska', '32': 'Nevada', '33': 'New Hampshire', '34': 'New Jersey', '35': 'New Mexico',
+    '36': 'New York', '37': 'North Carolina', '38': 'North Dakota', '39': 'Ohio', '40': 'Oklahoma',
+    '41': 'Oregon', '42': 'Pennsylvania', '44': 'Rhode Island', '45': 'South Carolina', '46': 'South Dakota',
+    '47': 'Tennessee', '48': 'Texas', '49': 'Utah', '50': 'Vermont', '51': 'Virginia', '53': 'Washington',
+    '54': 'West Virginia', '55': 'Wisconsin', '56': 'Wyoming', '72': 'Puerto Rico',
+}
+
+class CentroidIndex:
+    def __init__(self, df, max_km=OFFLINE_MAX_KM):
+        self.zips = df['zip'].to_numpy(dtype=object)
+        self.states = df['state'].to_numpy(dtype=object)
+        self.counties = df['county'].to_numpy(dtype=object)
+        lat = df['lat'].to_numpy(dtype=np.float64)
+        lng = df['lng'].to_numpy(dtype=np.float64)
+        self.index = GridIndex(TrackArrays(lat, lng, np.full(len(df), float(max_km))))
+
+    # The index for `path`, or None when the table is not there
+    @classmethod
+    def load(cls, path=CENTROIDS_PATH, max_km=OFFLINE_MAX_KM):
+        try:
+            df = pd.read_csv(path, dtype={'zip': str, 'state': str, 'county': str})
+        except FileNotFoundError:
+            return None
+        return cls(df, max_km)
+
+    # (state, county, zip) of the nearest centroid, or None when none is in range
+    def lookup(self, latitude, longitude):
+        pos, distances = self.index.intersect(latitude, longitude)
+        if not len(pos):
+            return None
+        i = pos[distances.argmin()]
+        return self.states[i], self.counties[i], self.zips[i]
+
+class GoogleGeocoder:
+    def __init__(self, api_key, timeout=TIMEOUT, cache_size=CACHE_SIZE):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=32))
+        self._cached = lru_cache(maxsize=cache_size)(self._fetch)
+
+    def lookup(self, latitude, longitude):
+        return self._cached(*snap(latitude, longitude, SNAP_DEG))
+
+    def _fetch(self, latitude, longitude):
+        response = self.session.get(GEOCODE_URL, params={'latlng': f"{latitude},{longitude}", 'key': self.api_key},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        data = data['results'][0]
+
+        # Extracting the ZIP code, state, and county
+        def component(kind):
+            return next(
+                (component['long_name'] for component in data['address_components']
+                 if kind in component['types']),
+                None
+            )
+
+        return component('administrative_area_level_1'), component('administrative_area_level_2'), component('postal_code')
+
+# Write the centroid table from the Census ZCTA gazetteer and ZCTA-to-county
+# relationship files (paths or URLs)
+def build_centroids(gazetteer=GAZETTEER_URL, relationship=RELATIONSHIP_URL, path=CENTROIDS_PATH):
+    gaz = pd.read_csv(gazetteer, sep='\t', dtype={'GEOID': str})
+    gaz.columns = gaz.columns.str.strip()
+    rel = pd.read_csv(relationship, sep='|', dtype={'GEOID_ZCTA5_20': str, 'GEOID_COUNTY_20': str},
+                      usecols=['GEOID_ZCTA5_20', 'GEOID_COUNTY_20', 'NAMELSAD_COUNTY_20', 'AREALAND_PART'])
+    rel = rel.dropna(subset=['GEOID_ZCTA5_20'])
+    rel = rel.sort_values('AREALAND_PART', ascending=False).drop_duplicates('GEOID_ZCTA5_20')
+    df = gaz.merge(rel, left_on='GEOID', right_on='GEOID_ZCTA5_20')
+    df = pd.DataFrame({
+        'zip': df['GEOID'],
+        'state': df['GEOID_COUNTY_20'].str[:2].map(STATE_FIPS),
+        'county': df['NAMELSAD_COUNTY_20'],
+        'lat': df['INTPTLAT'],
+        'lng': df['INTPTLONG'],
+    }).dropna(subset=['state']).sort_values('zip')
+    df.to_csv(path, index=False)
+    return path, len(df)
+
+if __name__ == "__main__":
+    print(build_centroids(*sys.argv[1:3]))
@@ -0,0 +1,336 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Parsing and on-disk caching of the HURDAT2 best-track file.
+#
+# The cleaned, radius-annotated table is written once per source file to
+# CACHE_DIR/<key>/ as one .npy per column, keyed by the sha256 of hurdat2.txt.
+# Startup then memory-maps those columns instead of re-parsing the text, and
+# every worker process mapping the same files shares their pages. When a new
+# release only appends storms, just the appended blocks are parsed and merged
+# into the previous entry.
+#
+# Build ahead of deploys with: python hurdat.py [hurdat2.txt]
+
+CACHE_DIR = 'hurdat_cache'
+# Bump when the parsed table changes shape so old caches are not reused
+CACHE_VERSION = 1
+
+cols = ['Id', 'Name', 'Date', 'Time', 'RecordID', 'Status', 'Lat', 'Lon',
+        'MaxWind', 'MinPressure', '34kt_NE', '34kt_SE', '34kt_SW', '34kt_NW',
+        '50kt_NE', '50kt_SE', '50kt_SW', '50kt_NW', '64kt_NE', '64kt_SE',
+        '64kt_SW', '64kt_NW', 't']
+
+dtypes = {
+    'Id': 'string',
+    'Name': 'string',
+    'Date': 'datetime64[ns]',
+    'Time': 'string',
+    'RecordID': 'string',
+    'Status': 'string',
+    'Lat': 'float64',
+    'Lon': 'float64',
+    'MaxWind': 'float64',
+    'MinPressure': 'float64',
+    '34kt_NE': 'float64',
+    '34kt_SE': 'float64',
+    '34kt_SW': 'float64',
+    '34kt_NW': 'float64',
+    '50kt_NE': 'float64',
+    '50kt_SE': 'float64',
+    '50kt_SW': 'float64',
+    '50kt_NW': 'float64',
+    '64kt_NE': 'float64',
+    '64kt_SE': 'float64',
+    '64kt_SW': 'float64',
+    '64kt_NW': 'float64'
+}
+
+RADII_COLS = ['34kt_NE', '34kt_SE', '34kt_SW', '34kt_NW',
+              '50kt_NE', '50kt_SE', '50kt_SW', '50kt_NW',
+              '64kt_NE', '64kt_SE', '64kt_SW', '64kt_NW']
+
+# Maximum wind radius in kilometers, per row: the largest of the 34/50/64 kt
+# radii in nautical miles, or 260 nm when none are recorded
+def max_radius_km(df):
+    mx = df[RADII_COLS].to_numpy(dtype=np.float64).max(axis=1, initial=-np.inf)
+    return np.where(mx < 10, 260., mx) * 1.852
+
+# Signed degrees from HURDAT2 coordinates such as "28.0N" / "94.8W". The
+# strings are viewed as a fixed-width byte matrix so the hemisphere letter can
+# be read and blanked out without a per-value Python call.
+def convert_lat_lon(values, negative):
+    chars = values.to_numpy(dtype='S8')
+    matrix = chars.view(np.uint8).reshape(len(chars), chars.itemsize)
+    last = (np.arange(len(chars)), (matrix != 0).sum(axis=1) - 1)
+    south_or_west = matrix[last] == ord(negative)
+    matrix[last] = 0
+    degrees = chars.astype(np.float64)
+    return np.where(south_or_west, -degrees, degrees)
+
+# Parse HURDAT2 text into the cleaned, radius-annotated table. Header lines
+# (Id, Name, number of fixes) have fewer than five fields; their Id and Name
+# are forward-filled onto the data lines that follow. Storms with fewer than
+# four fixes are dropped. Fields are right-aligned, so skipping the spaces
+# after each comma is all the trimming they need, and the numeric fields are
+# converted by the CSV reader itself (empty on header lines, hence NaN).
+def parse_hurdat2_text(text):
+    fields = range(len(cols) - 2)
+    numeric = {i: np.float64 for i in range(6, len(cols) - 3)}
+    if text.strip():
+        raw = pd.read_csv(io.StringIO(text), header=None, names=fields,
+                          dtype={i: numeric.get(i, str) for i in fields},
+                          keep_default_na=False, na_values=[''], skipinitialspace=True)
+    else:
+        raw = pd.DataFrame({i: pd.Series(dtype=numeric.get(i, object)) for i in fields})
+    text_fields = [i for i in fields if i not in numeric]
+    raw[text_fields] = raw[text_fields].fillna('')
+    header = (raw[4] == '').to_numpy()
+
+    storms = raw.loc[header, [0, 1]].assign(fixes=pd.to_numeric(raw.loc[header, 2], errors='coerce'))
+    storms = storms.reindex(raw.index).ffill()
+    keep = ~header & (storms['fixes'] >= 4).to_numpy()
+    raw = raw[keep]
+
+    df = pd.DataFrame({'Id': storms[0][keep], 'Name': storms[1][keep]})
+    df['Date'] = pd.to_datetime(raw[0], format='%Y%m%d')
+    for i, col in enumerate(cols[3:6], start=1):
+        df[col] = raw[i]
+    df['Lat'] = convert_lat_lon(raw[4], 'S')
+    df['Lon'] = convert_lat_lon(raw[5], 'W')
+    for i, col in enumerate(cols[8:], start=6):
+        df[col] = raw[i]
+    df = df.reset_index(drop=True).astype(dtypes)
+    df['MaxRadius_km'] = max_radius_km(df)
+    return df
+
+# Parse the full record
+def parse_hurdat2(path):
+    with open(path, 'r') as file:
+        return parse_hurdat2_text(file.read())
+
+# Replace the storms in `df` that appear in `new` and append the rest, keeping
+# each storm's fixes contiguous
+def upsert_storms(df, new):
+    if not len(new):
+        return df
+    if is_compact(df):
+        new = to_compact(new) if not is_compact(new) else new
+    kept = df[~df['Id'].isin(new['Id'].unique())]
+    merged = pd.concat([kept, new[kept.columns]], ignore_index=True)
+    # Categoricals with different categories concatenate to object columns
+    return to_compact(merged) if is_compact(df) else merged
+
+# Compact storage for the table: Ids, Names and the other text fields as
+# categoricals, integral fields as int16, Date+Time as one int64 epoch (in
+# seconds, UTC) and the unused `t` column dropped. Lat, Lon and MaxRadius_km
+# stay float64 since they are returned as-is by the API.
+COMPACT_CATEGORIES = ['Id', 'Name', 'RecordID', 'Status']
+COMPACT_INT16 = ['MaxWind', 'MinPressure'] + RADII_COLS
+
+def to_compact(df):
+    out = pd.DataFrame(index=df.index)
+    for col in df.columns:
+        if col in COMPACT_CATEGORIES:
+            # Sorted categories, so grouping by them keeps the string order
+            out[col] = df[col].astype(object).astype('category')
+        elif col == 'Date':
+            hhmm = df['Time'].astype(np.int64).to_numpy()
+            out['Epoch'] = (df['Date'].to_numpy('datetime64[s]').astype(np.int64)
+                            + hhmm // 100 * 3600 + hhmm % 100 * 60)
+        elif col in COMPACT_INT16:
+            out[col] = df[col].to_numpy().astype(np.int16)
+        elif col not in ('Time', 't'):
+            out[col] = df[col]
+    return out
+
+def is_compact(df):
+    return 'Epoch' in df.columns
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def cache_name(source_hash, compact=False):
+    return f"{source_hash[:16]}-v{CACHE_VERSION}" + ("-compact" if compact else "")
+
+def cache_path(path, cache_dir=CACHE_DIR, compact=False):
+    return os.path.join(cache_dir, cache_name(file_hash(path), compact))
+
+# Write a parsed table to the cache entry `target`, replacing stale entries.
+# The source's size and hash are recorded so a later release that only
+# appends to it can be ingested incrementally.
+def write_cache(df, target, source_path, source_hash):
+    cache_dir = os.path.dirname(target)
+    tmp = f"{target}.tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    meta = {'columns': [], 'source': os.path.basename(source_path), 'rows': len(df),
+            'source_size': os.path.getsize(source_path), 'source_sha256': source_hash}
+    for col in df.columns:
+        values = df[col].to_numpy()
+        column = {'name': col, 'dtype': str(values.dtype)}
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Codes are memory-mapped, the (few) categories live in meta.json
+            values = df[col].cat.codes.to_numpy()
+            column.update(dtype='category', categories=df[col].cat.categories.tolist())
+        elif dtypes.get(col) == 'string' or values.dtype == object:
+            # Fixed-width unicode keeps string columns memory-mappable
+            values = df[col].astype(str).to_numpy().astype(str)
+            column['dtype'] = dtypes.get(col, str(values.dtype))
+        np.save(os.path.join(tmp, f"{len(meta['columns'])}.npy"), values)
+        meta['columns'].append(column)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as file:
+        json.dump(meta, file)
+
+    # Another process may have written the same entry first; a complete one
+    # is kept, a partial one (no meta.json) replaced
+    try:
+        if not os.path.exists(os.path.join(target, 'meta.json')):
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(tmp, target)
+    except OSError:
+        if not os.path.exists(os.path.join(target, 'meta.json')):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    # Older entries of the same storage mode are stale
+    mode = os.path.basename(target).split('-', 1)[1]
+    for entry in os.listdir(cache_dir):
+        stale = os.path.join(cache_dir, entry)
+        if stale != target and os.path.isdir(stale) and entry.split('-', 1)[-1] == mode:
+            shutil.rmtree(stale, ignore_errors=True)
+    return target
+
+# Write the parsed table for `path` to the cache
+def build_cache(path='hurdat2.txt', cache_dir=CACHE_DIR, compact=False):
+    source_hash = file_hash(path)
+    target = os.path.join(cache_dir, cache_name(source_hash, compact))
+    df = parse_hurdat2(path)
+    return write_cache(to_compact(df) if compact else df, target, path, source_hash)
+
+# Newest complete cache entry of the current version and mode, or None
+def latest_cache(cache_dir=CACHE_DIR, compact=False):
+    if not os.path.isdir(cache_dir):
+        return None
+    suffix = cache_name('', compact)
+    entries = [os.path.join(cache_dir, entry) for entry in os.listdir(cache_dir)
+               if entry.endswith(suffix)
+               and os.path.exists(os.path.join(cache_dir, entry, 'meta.json'))]
+    return max(entries, key=os.path.getmtime, default=None)
+
+# Update the newest cache entry to match `path` by parsing only the storm
+# blocks appended since it was built. Returns the new entry, or None when the
+# file was rewritten rather than appended to (a full rebuild is needed).
+def ingest_appended(path, cache_dir=CACHE_DIR, compact=False):
+    previous = latest_cache(cache_dir, compact)
+    if previous is None:
+        return None
+    with open(os.path.join(previous, 'meta.json')) as file:
+        meta = json.load(file)
+    size = meta.get('source_size')
+    if size is None or os.path.getsize(path) < size:
+        return None
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as file:
+        head = file.read(size)
+        tail = file.read()
+    h.update(head)
+    if h.hexdigest() != meta.get('source_sha256'):
+        return None
+
+    text = tail.decode()
+    first = next((line for line in text.splitlines() if line.strip()), None)
+    # Fixes appended to the previous last storm have no header to attach to
+    if first is not None and len(first.split(',')) >= 5:
+        return None
+    new = parse_hurdat2_text(text)
+    df = upsert_storms(read_cache(previous), new)
+    h.update(tail)
+    source_hash = h.hexdigest()
+    target = os.path.join(cache_dir, cache_name(source_hash, compact))
+    return write_cache(df, target, path, source_hash)
+
+# Storms from advisory files (HURDAT2-format blocks) dropped into feed_dir,
+# in file-name order; a later block for the same storm replaces an earlier one
+def load_advisories(feed_dir):
+    if not feed_dir or not os.path.isdir(feed_dir):
+        return None
+    merged = None
+    for name in sorted(os.listdir(feed_dir)):
+        if name.endswith('.txt'):
+            with open(os.path.join(feed_dir, name)) as file:
+                new = parse_hurdat2_text(file.read())
+            merged = new if merged is None else upsert_storms(merged, new)
+    return merged
+
+# Map the cached columns back into a DataFrame. Numeric and date columns stay
+# backed by the read-only memmaps; string columns become pandas strings.
+def read_cache(target):
+    with open(os.path.join(target, 'meta.json')) as file:
+        meta = json.load(file)
+    columns = {}
+    for i, col in enumerate(meta['columns']):
+        values = np.load(os.path.join(target, f"{i}.npy"), mmap_mode='r')
+        if col['dtype'] == 'string':
+            values = pd.array(values.astype(object), dtype='string')
+        elif col['dtype'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=col['categories'])
+        columns[col['name']] = values
+    return pd.DataFrame(columns, copy=False)
+
+# Records from the last `years` years. Storms are listed in order of genesis,
+# so the kept rows are normally a suffix and a slice keeps the memmapped
+# columns shared.
+def since(df, years):
+    if years is None:
+        return df
+    cutoff_date = datetime.now() - timedelta(days=years * 365)
+    if is_compact(df):
+        keep = df['Epoch'].to_numpy() >= int(pd.Timestamp(cutoff_date).timestamp())
+    else:
+        keep = (df['Date'] >= cutoff_date).to_numpy()
+    start = int(keep.argmax()) if keep.any() else len(keep)
+    if keep[start:].all():
+        return df.iloc[start:]
+    return df[keep]
+
+# Load the parsed table for `path`. A stale cache is brought up to date
+# incrementally when the file was only appended to, and rebuilt otherwise.
+# Storms from advisory files in feed_dir are merged on top. With compact=True
+# the table uses the compact storage described at to_compact.
+def load_hurdat(path='hurdat2.txt', cache_dir=CACHE_DIR, years=None, feed_dir=None, compact=False):
+    target = cache_path(path, cache_dir, compact)
+    if not os.path.exists(os.path.join(target, 'meta.json')):
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            target = ingest_appended(path, cache_dir, compact) or build_cache(path, cache_dir, compact)
+        except OSError as e:
+            logger.warning("Could not write HURDAT2 cache (%s), parsing %s directly.", e, path)
+            df = parse_hurdat2(path)
+            df = to_compact(df) if compact else df
+            target = None
+    df = read_cache(target) if target else df
+
+    advisories = load_advisories(feed_dir)
+    if advisories is not None:
+        df = upsert_storms(df, advisories)
+    return since(df, years)
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else 'hurdat2.txt'
+    print(build_cache(source))
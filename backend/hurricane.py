@@ -1,90 +1,14 @@
-from datetime import datetime, timedelta
 import pandas as pd
-import numpy as np
 from geopy.distance import geodesic
-from numba import jit
-
-
-# Define the columns
-cols = ['Id', 'Name', 'Date', 'Time', 'RecordID',
-        'Status', 'Lat', 'Lon',
-        'MaxWind', 'MinPressure',
-        '34kt_NE', '34kt_SE', '34kt_SW', '34kt_NW',
-        '50kt_NE', '50kt_SE', '50kt_SW', '50kt_NW',
-        '64kt_NE', '64kt_SE', '64kt_SW', '64kt_NW', 't']
-
-# Prepare a list to collect data
-data = []
-
-# Function to convert latitude/longitude strings to float
-def convert_lat_lon(lat_str, lon_str):
-    lat = float(lat_str[:-1])  # Remove the last character (N/S)
-    lon = float(lon_str[:-1])  # Remove the last character (E/W)
-    if lat_str.endswith('S'):
-        lat = -lat  # Southern hemisphere
-    if lon_str.endswith('W'):
-        lon = -lon  # Western hemisphere
-    return lat, lon
-
-# Read the file and process the lines
-with open('hurdat2.txt', 'r') as file:
-    name = ""
-    id = ""
-    skip = False
-    for line in file:
-        values = [value.strip() for value in line.strip().split(",")]
-        if len(values) < 5:
-            name = values[1]
-            id = values[0]
-            if (cnt := int(values[2])) < 4:
-                skip = True
-            else:
-                skip = False
-            continue
-        if skip: continue
-        # Convert lat/lon
-        lat, lon = convert_lat_lon(values[4], values[5])  # 'Lat' and 'Lon' columns
-        # Append the row as a dictionary
-        row = [id, name] + values[:4] + [lat, lon] + values[6:]
-        data.append(row)
-
-# Create the DataFrame using from_records with specified dtypes
-dtypes = {
-    'Id': 'string',
-    'Name': 'string',
-    'Date': 'datetime64[ns]',
-    'Time': 'string',
-    'RecordID': 'string',
-    'Status': 'string',
-    'Lat': 'float64',
-    'Lon': 'float64',
-    'MaxWind': 'float64',
-    'MinPressure': 'float64',
-    '34kt_NE': 'float64',
-    '34kt_SE': 'float64',
-    '34kt_SW': 'float64',
-    '34kt_NW': 'float64',
-    '50kt_NE': 'float64',
-    '50kt_SE': 'float64',
-    '50kt_SW': 'float64',
-    '50kt_NW': 'float64',
-    '64kt_NE': 'float64',
-    '64kt_SE': 'float64',
-    '64kt_SW': 'float64',
-    '64kt_NW': 'float64'
-}
-
-
-df = pd.DataFrame.from_records(data, columns=cols).astype(dtypes)
-pd.set_option('display.max_columns', None)
 
-# Calculate the cutoff date for the last 10 years
-cutoff_date = datetime.now() - timedelta(days=15 * 365)  # Approximation for 10 years
+from tracks import TrackArrays
+from spatial import GridIndex
+from hurdat import load_hurdat
 
-# Convert the 'Date' column to datetime for filtering
-df['Date'] = pd.to_datetime(df['Date'])
-df = df[df['Date'] >= cutoff_date]
 
+# Load the cleaned, radius-annotated table (from the binary cache when fresh)
+df = load_hurdat('hurdat2.txt', years=15)
+pd.set_option('display.max_columns', None)
 
 # Print the tail of the DataFrame
 print(df.tail())
@@ -92,55 +16,16 @@ print(df.tail())
 print("Median Latitude:", df['Lat'].median())
 print("Median Longitude:", df['Lon'].median())
 
-# Function to calculate the maximum radius in kilometers
-def calculate_max_radius(row):
-    """Calculate the maximum wind radius in kilometers from the wind speed columns."""
-    wind_radii = [
-        row['34kt_NE'], row['34kt_SE'], row['34kt_SW'], row['34kt_NW'],
-        row['50kt_NE'], row['50kt_SE'], row['50kt_SW'], row['50kt_NW'],
-        row['64kt_NE'], row['64kt_SE'], row['64kt_SW'], row['64kt_NW']
-    ]
-    mx = max(wind_radii)
-    if mx < 10:
-        mx = 260.
-    return mx * 1.852  # Convert knots to kilometers
-
-# Calculate maximum radius for each hurricane
-df['MaxRadius_km'] = df.apply(calculate_max_radius, axis=1)
-# Function to create bounding box and filter
-# Haversine function to calculate the distance between two points
-@jit(nopython=True)
-def haversine(lat1, lon1, lat2, lon2):
-    """Calculate the great-circle distance between two points on the Earth."""
-    # Convert degrees to radians
-    lat1_rad = np.radians(lat1)
-    lon1_rad = np.radians(lon1)
-    lat2_rad = np.radians(lat2)
-    lon2_rad = np.radians(lon2)
-    
-    # Haversine formula
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    a = np.sin(dlat / 2.0)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2.0)**2
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    
-    # Radius of Earth in kilometers
-    r = 6371.0
-    return r * c
+# Spatial index over the fix positions, shared with the /find_hurricanes endpoint
+track_index = GridIndex(TrackArrays.from_df(df))
+
 def find_intersecting_hurricanes_fast(df, target_lat, target_lon):
     """Find hurricanes that intersect with a given latitude and longitude based on their MaxRadius_km."""
-    intersecting_hurricanes = []
-
-    for _, row in df.iterrows():
-        hurricane_location = (row['Lat'], row['Lon'])
-        distance = haversine(hurricane_location[0], hurricane_location[1], target_lat, target_lon)
-        
-        # Use MaxRadius_km for comparison
-        if distance <= row['MaxRadius_km']:
-            row['Distance_km'] = distance  # Add distance to the row
-            intersecting_hurricanes.append(row)
-
-    return pd.DataFrame(intersecting_hurricanes)# Example usage: Check for hurricanes intersecting with a position
+    pos, distances = track_index.intersect(target_lat, target_lon)
+    intersecting_hurricanes = df.iloc[pos].copy()
+    intersecting_hurricanes['Distance_km'] = distances  # Add distance to the rows
+    return intersecting_hurricanes
+
 # Example usage: Check for hurricanes intersecting with a position
 target_lat = 27.9517  # example latitude
 target_lon = -82.45    # example longitude
@@ -0,0 +1,72 @@
+import logging
+import threading
+
+from metrics import span
+
+# Heavy clients (Earth Engine, Gemini, Pinecone, the embedding model) created
+# on first use instead of at import, so the process serves the endpoints that
+# need none of them right away.
+#
+# Lazy(name, factory) calls factory() the first time get() is called and
+# returns the same object from then on. Construction runs under a lock, so
+# concurrent first callers share it. A factory that raises is logged and
+# tried again by the next get(). warm_up() builds some of them in background
+# threads ahead of the first request, and status() reports all of them for
+# the readiness endpoint.
+
+logger = logging.getLogger(__name__)
+
+_registry = []
+
+class Lazy:
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.value = None
+        self.ready = False
+        self.started = False
+        self.error = None
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def get(self):
+        if self.ready:
+            return self.value
+        with self.lock:
+            if not self.ready:
+                self.started = True
+                try:
+                    with span(f'init_{self.name}'):
+                        value = self.factory()
+                except Exception as e:
+                    self.error = repr(e)
+                    logger.exception("initializing %s failed", self.name)
+                    raise
+                self.value, self.error = value, None
+                self.ready = True
+                logger.info("initialized %s", self.name)
+        return self.value
+
+    # 'ready', 'failed' (last attempt raised), 'initializing' or 'pending'
+    def status(self):
+        if self.ready:
+            return 'ready'
+        if self.error is not None:
+            return 'failed'
+        return 'initializing' if self.started else 'pending'
+
+# Build each of `lazies` in its own daemon thread
+def warm_up(lazies):
+    def build(lazy):
+        try:
+            lazy.get()
+        except Exception:
+            pass  # logged by get(); retried on first use
+
+    threads = [threading.Thread(target=build, args=(lazy,), name=f'warm-{lazy.name}', daemon=True) for lazy in lazies]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def status():
+    return {lazy.name: lazy.status() for lazy in _registry}
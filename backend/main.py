@@ -1,208 +1,214 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from pydantic import BaseModel
-from datetime import datetime, timedelta
 import pandas as pd
-import numpy as np
 from geopy.distance import geodesic
 import json
-import requests
+import logging
 import os
-
-import google.generativeai as genai
-
-from sat import ImgSat
-from pc import retrieve_from_pinecone
-from embed import get_model_and_tokenizer
-from gemini import get_gemini_response
-
-from pinecone import Pinecone
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pc import Retriever, LocalIndex
+from response_cache import ResponseCache, snap
+from zipcodes import ZipIndex
+from geocoder import CentroidIndex, GoogleGeocoder
+from portfolio import summarize_locations, start_pool
+from storm_data import load_storm_data, StormDataWatcher
+from climatology import describe as describe_climatology
+import metrics
+from metrics import span, timed
+import lazy
+from lazy import Lazy
 
 from flask_cors import CORS, cross_origin
 app = Flask(__name__)
 cors = CORS(app)
 app.config['CORS_HEADERS'] = 'Content-Type'
 
-# Load and preprocess the data when the app starts
-cols = ['Id', 'Name', 'Date', 'Time', 'RecordID', 'Status', 'Lat', 'Lon',
-        'MaxWind', 'MinPressure', '34kt_NE', '34kt_SE', '34kt_SW', '34kt_NW',
-        '50kt_NE', '50kt_SE', '50kt_SW', '50kt_NW', '64kt_NE', '64kt_SE',
-        '64kt_SW', '64kt_NW', 't']
-
-dtypes = {
-    'Id': 'string',
-    'Name': 'string',
-    'Date': 'datetime64[ns]',
-    'Time': 'string',
-    'RecordID': 'string',
-    'Status': 'string',
-    'Lat': 'float64',
-    'Lon': 'float64',
-    'MaxWind': 'float64',
-    'MinPressure': 'float64',
-    '34kt_NE': 'float64',
-    '34kt_SE': 'float64',
-    '34kt_SW': 'float64',
-    '34kt_NW': 'float64',
-    '50kt_NE': 'float64',
-    '50kt_SE': 'float64',
-    '50kt_SW': 'float64',
-    '50kt_NW': 'float64',
-    '64kt_NE': 'float64',
-    '64kt_SE': 'float64',
-    '64kt_SW': 'float64',
-    '64kt_NW': 'float64'
-}
-
-genai.configure(api_key="")
-gemini = genai.GenerativeModel("gemini-1.5.flash")
-isat = ImgSat()
-
-pc = Pinecone(api_key="")
-index = pc.Index("news-hurricanes")
-embed_model, embed_tokenizer = get_model_and_tokenizer()
-
-# Read and preprocess the data
-def load_data():
-    data = []
-
-    def convert_lat_lon(lat_str, lon_str):
-        lat = float(lat_str[:-1])
-        lon = float(lon_str[:-1])
-        if lat_str.endswith('S'):
-            lat = -lat
-        if lon_str.endswith('W'):
-            lon = -lon
-        return lat, lon
-
-    with open('hurdat2.txt', 'r') as file:
-        name = ""
-        id = ""
-        skip = False
-        for line in file:
-            values = [value.strip() for value in line.strip().split(",")]
-            if len(values) < 5:
-                name = values[1]
-                id = values[0]
-                skip = int(values[2]) < 4
-                continue
-            if skip: continue
-            lat, lon = convert_lat_lon(values[4], values[5])
-            row = [id, name] + values[:4] + [lat, lon] + values[6:]
-            data.append(row)
-
-    df = pd.DataFrame.from_records(data, columns=cols).astype(dtypes)
-    df['Date'] = pd.to_datetime(df['Date'])
-    cutoff_date = datetime.now() - timedelta(days=15 * 365)
-    df = df[df['Date'] >= cutoff_date]
-
-    df['MaxRadius_km'] = df.apply(calculate_max_radius, axis=1)
-    return df
-
-# Calculate the maximum radius in kilometers
-def calculate_max_radius(row):
-    wind_radii = [
-        row['34kt_NE'], row['34kt_SE'], row['34kt_SW'], row['34kt_NW'],
-        row['50kt_NE'], row['50kt_SE'], row['50kt_SW'], row['50kt_NW'],
-        row['64kt_NE'], row['64kt_SE'], row['64kt_SW'], row['64kt_NW']
-    ]
-    mx = max(wind_radii)
-    if mx < 10:
-        mx = 260.
-    return mx * 1.852
-
-# Haversine function to calculate distance
-def haversine(lat1, lon1, lat2, lon2):
-    lat1_rad = np.radians(lat1)
-    lon1_rad = np.radians(lon1)
-    lat2_rad = np.radians(lat2)
-    lon2_rad = np.radians(lon2)
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    a = np.sin(dlat / 2.0)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2.0)**2
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    r = 6371.0
-    return r * c
-
-# Find hurricanes that intersect with a given location
-def find_intersecting_hurricanes(df, target_lat, target_lon):
-    intersecting_hurricanes = []
-
-    for _, row in df.iterrows():
-        distance = haversine(row['Lat'], row['Lon'], target_lat, target_lon)
-        if distance <= row['MaxRadius_km']:
-            row['Distance_km'] = distance
-            intersecting_hurricanes.append(row)
-
-    return pd.DataFrame(intersecting_hurricanes)
+# LOG_LEVEL=DEBUG also logs every timed span and the Gemini prompts
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'),
+                    format='%(asctime)s %(levelname)s %(name)s %(message)s')
+logger = logging.getLogger(__name__)
+
+# Per-endpoint request latency and counts; streamed responses are timed up to
+# the point the stream starts
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    if 'request_start' in g:
+        metrics.observe('request_duration_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    metrics.inc('requests_total', endpoint=endpoint, status=response.status_code)
+    return response
+
+# Latency histograms and counters in the Prometheus text format
+@app.route("/metrics", methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Clients only /analysis needs are created on first use (see lazy.py), so
+# the lightweight endpoints serve as soon as the storm and insurance data are
+# loaded. WARM_UP=0 skips building them in the background at startup.
+def load_gemini():
+    import google.generativeai as genai
+    import gemini
+    genai.configure(api_key="")
+    return gemini
+
+def load_imgsat():
+    from sat import ImgSat
+    return ImgSat()
+
+# PINECONE_SNAPSHOT: an index exported with `python pc.py export`, queried
+# in-process instead of Pinecone (offline runs)
+def load_news_index():
+    pinecone_snapshot = os.environ.get('PINECONE_SNAPSHOT')
+    if pinecone_snapshot:
+        return LocalIndex.load(pinecone_snapshot)
+    from pinecone import Pinecone
+    pc = Pinecone(api_key="")
+    return pc.Index("news-hurricanes")
+
+# Returns prompts -> embeddings. EMBED_SERVER (comma-separated socket paths,
+# with EMBED_AUTHKEY in hex) sends them to the inference workers started by
+# serve.py; otherwise the model is loaded here. EMBED_BACKEND: torch
+# (default), int8, onnx or onnx-int8; see embed.py
+def load_embedding():
+    embed_server = os.environ.get('EMBED_SERVER')
+    if embed_server:
+        from embed_pool import EmbedClient
+        return EmbedClient(embed_server.split(','), bytes.fromhex(os.environ['EMBED_AUTHKEY'])).embed
+    from embed import get_model_and_tokenizer, embed
+    embed_threads = os.environ.get('EMBED_THREADS')
+    model, tokenizer = get_model_and_tokenizer(
+        backend=os.environ.get('EMBED_BACKEND', 'torch'),
+        threads=int(embed_threads) if embed_threads else None,
+        verify=os.environ.get('EMBED_VERIFY') == '1')
+    return lambda prompts: embed(prompts, model, tokenizer)
+
+gemini_client = Lazy('gemini', load_gemini)
+isat = Lazy('earth_engine', load_imgsat)
+news_index = Lazy('news_index', load_news_index)
+embedding = Lazy('embedding', load_embedding)
 
 # Input model for the API
 class LocationInput(BaseModel):
     lat: float
     lng: float
 
-# Load data at startup
-df = load_data()
-
-# API endpoint to find hurricanes
+# Load data at startup. The last 15 years of HURDAT2 plus any advisory files
+# (HURDAT2-format blocks for active storms) in ADVISORY_DIR; the watcher swaps
+# in a fresh dataset when either changes or the cutoff date moves, so each
+# request reads `storm_data` once and uses that snapshot throughout.
+# HURDAT_COMPACT=1 keeps the table in the compact storage mode (see
+# hurdat.to_compact) for running more workers per host. On a cold cache the
+# exposure grid and climatology are not built here: requests are served from
+# the plain track index (and /climatology answers 503) until the watcher has
+# built them and swapped them in.
+HURDAT_PATH = 'hurdat2.txt'
+ADVISORY_DIR = os.environ.get('ADVISORY_DIR', 'advisories')
+HURDAT_COMPACT = os.environ.get('HURDAT_COMPACT') == '1'
+storm_data = load_storm_data(HURDAT_PATH, years=15, feed_dir=ADVISORY_DIR, build_grid=False,
+                             compact=HURDAT_COMPACT)
+
+def swap_storm_data(data):
+    global storm_data
+    storm_data = data
+
+# Optional process pool for large /find_hurricanes_batch inputs, forked here
+# before any thread starts (see portfolio.py). PORTFOLIO_WORKERS sets its
+# size; the default 0 scores every batch in-process, as serve.py's workers
+# do, so importing main (the debug reloader, bench_backend.py) forks nothing.
+portfolio_workers = int(os.environ.get('PORTFOLIO_WORKERS', '0'))
+if portfolio_workers > 0:
+    start_pool(storm_data, portfolio_workers)
+
+storm_watcher = StormDataWatcher(swap_storm_data, HURDAT_PATH, years=15, feed_dir=ADVISORY_DIR,
+                                 compact=HURDAT_COMPACT, initial=storm_data)
+storm_watcher.start()
+
+class HurricaneQuery(LocationInput):
+    # Points as {"lat": [...], "lng": [...], "r": [...], "speed": [...]}
+    columnar: bool = False
+    # Douglas-Peucker tolerance in km for simplifying the tracks
+    simplifyKm: float | None = None
+
+# API endpoint to find hurricanes: the 5 storms passing closest to the
+# location, with their tracks
 @app.route("/find_hurricanes", methods=['POST'])
 def find_hurricanes():
+    query = HurricaneQuery(**request.json)
+    data = storm_data
+    with span('hurricane_intersect'):
+        pos, distances = data.exposure_index.intersect(query.lat, query.lng)
+    storms = data.storm_tracks.nearest(pos, distances, top=5)
+    body = data.storm_tracks.response(storms, query.simplifyKm, query.columnar)
+    return Response(body, mimetype='application/json')
+
+# Storms whose interpolated, quadrant-aware wind field reached the location,
+# with the highest wind threshold (34/50/64 kt) experienced there
+@app.route("/find_wind_exposure", methods=['POST'])
+def find_wind_exposure():
     location = LocationInput(**request.json)
-    target_lat = location.lat
-    target_lon = location.lng
-
-    intersecting_df = find_intersecting_hurricanes(df, target_lat, target_lon)
-    top_5_ids = (
-        intersecting_df.groupby('Id')
-        .agg(Name=('Name', 'max'), Min_Distance_km=('Distance_km', 'min'), Max_Wind=('MaxWind', 'max'))
-        .sort_values(by='Min_Distance_km')
-        .head(5)
-        .index.tolist()
-    )
-
-    matching_rows_df = df[df['Id'].isin(top_5_ids)]
-    
-    colors = ['#343131','#A04747','#D8A25E','#EEDF7A','#E2F1E7']
-    hurricanes_json = {}
-    idx = 0
-
-    for hurricane_id, group in matching_rows_df.groupby('Id'):
-        hurricanes_json[hurricane_id] = {
-            'name': group['Name'].iloc[0],
-            'maxSpeed': group['MaxWind'].max(),
-            'color': colors[idx],
-            'points': [{'lat': row['Lat'], 'lng': row['Lon'], 'r': row['MaxRadius_km'], 'speed': row['MaxWind']} for _, row in group.iterrows()]
+    data = storm_data
+    with span('wind_exposure'):
+        exposure = data.footprint_index.storm_exposure(data.df, location.lat, location.lng)
+    return jsonify({
+        storm_id: {
+            'name': data.storm_names[storm_id],
+            'minDistanceKm': float(row['Min_Distance_km']),
+            'thresholdKt': int(row['Max_Threshold_kt'])
         }
-        idx += 1
-    print(hurricanes_json)
-    return jsonify(hurricanes_json)
+        for storm_id, row in exposure.iterrows()
+    })
 
+# Storm climatology of the 0.25 degree cell containing the location, over the
+# whole HURDAT2 record: storms passing within 50 nmi by Saffir-Simpson
+# category, max wind, return periods and storms per decade with their trend
+# (see climatology.py)
+@app.route("/climatology", methods=['POST'])
+def get_climatology():
+    location = LocationInput(**request.json)
+    climatology = storm_data.climatology
+    if climatology is None:
+        return jsonify({"detail": "Climatology not available yet"}), 503
+    summary = climatology.at(location.lat, location.lng)
+    if summary is None:
+        return jsonify({"detail": "Location outside the storm grid"}), 404
+    return jsonify(summary)
+
+class PortfolioInput(BaseModel):
+    points: list[LocationInput]
+    top: int = 5
+
+# Exposure summaries for many locations, streamed back as NDJSON in input
+# order: top storms by distance, min distance and max wind per location
+@app.route("/find_hurricanes_batch", methods=['POST'])
+def find_hurricanes_batch():
+    portfolio = PortfolioInput(**request.json)
+    points = [(p.lat, p.lng) for p in portfolio.points]
+    data = storm_data
+
+    def lines():
+        for i, summary in enumerate(summarize_locations(data, points, portfolio.top)):
+            summary['index'] = i
+            yield json.dumps(summary) + "\n"
+
+    return Response(lines(), mimetype='application/x-ndjson')
+
+# Reverse geocoding: offline from the ZIP centroid table when the location is
+# near a known centroid, else the Google Geocoding API (pooled, cached)
+zip_centroids = CentroidIndex.load()
+google_geocoder = GoogleGeocoder(api_key="")  # Replace with your API key
+
+@timed('geocode')
 def get_location_details(latitude, longitude):
-    api_key = ""  # Replace with your API key
-    url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={latitude},{longitude}&key={api_key}"
-    response = requests.get(url)
-    data = response.json()
-    data = data['results'][0]
-
-    # Extracting the ZIP code, state, and county
-    zip_code = next(
-        (component['long_name'] for component in data['address_components']
-         if 'postal_code' in component['types']),
-        None
-    )
-
-    state = next(
-        (component['long_name'] for component in data['address_components']
-         if 'administrative_area_level_1' in component['types']),
-        None
-    )
-
-    county = next(
-        (component['long_name'] for component in data['address_components']
-         if 'administrative_area_level_2' in component['types']),
-        None
-    )
-
-    return state, county, zip_code
+    details = zip_centroids.lookup(latitude, longitude) if zip_centroids is not None else None
+    metrics.inc('geocode_total', source='offline' if details else 'google')
+    return details or google_geocoder.lookup(latitude, longitude)
 
 def load_zip_data():
     try:
@@ -215,56 +221,162 @@ def load_zip_data():
         })
         return df
     except FileNotFoundError:
-        print("CSV file not found. Make sure the file is placed in the correct location.")
+        logger.warning("CSV file not found. Make sure the file is placed in the correct location.")
         return pd.DataFrame()
 
 df_zip = load_zip_data()
+zip_index = ZipIndex(df_zip)
 
 # Input model for ZIP code
 class ZipInput(BaseModel):
     zipcode: str
 
+class ZipBatchInput(BaseModel):
+    zipcodes: list[str]
+
 @app.route("/get_zip_data", methods=['POST'])
 def get_zip_data():
     zip_input = ZipInput(**request.json)
-    zipcode = zip_input.zipcode
-    matching_rows = df_zip[df_zip['ZIP code'] == zipcode]
+    zip_data = zip_index.get(zip_input.zipcode)
 
-    if matching_rows.empty:
+    if zip_data is None:
         return jsonify({"detail": "ZIP code not found"}), 404
-
-    # Convert the matching rows to a dictionary
-    zip_data = matching_rows.to_dict(orient='records')
-    return jsonify(zip_data[0])
-
-def getZ(zipcode):
-    # Filter the DataFrame for the requested ZIP code
-    matching_rows = df_zip[df_zip['ZIP code'] == zipcode]
-
-    if matching_rows.empty:
-        matching_rows = df_zip[df_zip['ZIP code'] == "33592"]
-
-    # Convert the matching rows to a dictionary
-    zip_data = matching_rows.to_dict(orient='records')
-    return zip_data[0]
-
-@app.route("/analysis", methods=['POST'])
-def get_info():
-    inp = LocationInput(**request.json)
-    state, county, zip = get_location_details(inp.lat, inp.lng)
-    print(state, county, zip)
-    dt = getZ(zip)
-    rag, sources = retrieve_from_pinecone(index, embed_model, embed_tokenizer, state, county, zip)
-    sat_vid, gemini_response = get_gemini_response(gemini, isat, inp.lat, inp.lng, rag, state, county, zip, dt["Average annual cost"], dt["Percent difference from national average"])
-    ret = jsonify({
+    return jsonify(zip_data)
+
+# Records for many ZIP codes at once, null for unknown ones
+@app.route("/get_zip_data_batch", methods=['POST'])
+def get_zip_data_batch():
+    zip_input = ZipBatchInput(**request.json)
+    return jsonify(dict(zip(zip_input.zipcodes, zip_index.get_many(zip_input.zipcodes))))
+
+# Insurance record for a ZIP, falling back to the nearest known ZIP
+@timed('zip_lookup')
+def getZ(zipcode, state=None):
+    return zip_index.nearest(zipcode, state)
+
+# Runs the independent network stages of /analysis concurrently
+executor = ThreadPoolExecutor(max_workers=32)
+# Background refreshes of stale cache entries, one pool per cache. Kept apart
+# from `executor`: an analysis refresh fans out onto `executor` and waits for
+# it (and its retrieval may wait on a news refresh), so sharing a pool
+# deadlocks once every thread is a refresh waiting on queued subtasks.
+analysis_refresh = ThreadPoolExecutor(max_workers=8)
+news_refresh = ThreadPoolExecutor(max_workers=4)
+# Seconds an /analysis request waits for news retrieval and for the
+# satellite video (render, transcode, upload and processing)
+RAG_TIMEOUT = 120
+VIDEO_TIMEOUT = 600
+
+# News context per (state, county, zip): fresh for a day, then served stale
+# for up to a week while one background query refreshes it
+def load_retriever():
+    return Retriever(news_index.get(), None, None, embedder=embedding.get(),
+                     cache=ResponseCache(news_refresh, ttl=24 * 3600, stale_ttl=7 * 24 * 3600))
+
+retriever = Lazy('retriever', load_retriever)
+
+if os.environ.get('WARM_UP', '1') == '1':
+    lazy.warm_up([gemini_client, isat, retriever])
+
+# Satellite video for a location, converted and uploaded to Gemini
+def prepare_video(lat, lng):
+    return gemini_client.get().prepare_video(isat.get(), lat, lng)
+
+# Gemini text for a prepared video, re-uploading once if the handle is rejected
+def generate_response(video_file, lat, lng, *args, **kwargs):
+    return gemini_client.get().generate_response_retrying(isat.get(), video_file, lat, lng, *args, **kwargs)
+
+# Gather everything the Gemini prompt needs for a location
+def prepare_analysis(lat, lng):
+    # The satellite video only depends on the coordinates, so its render,
+    # transcode and upload overlap with geocoding and document retrieval.
+    video_future = executor.submit(prepare_video, lat, lng)
+    state, county, zip = get_location_details(lat, lng)
+    logger.info("analysis lat=%s lng=%s state=%s county=%s zip=%s", lat, lng, state, county, zip)
+    rag_future = executor.submit(retriever.get().retrieve, state, county, zip)
+    dt = getZ(zip, state)
+    climatology = storm_data.climatology
+    climate = describe_climatology(climatology.at(lat, lng)) if climatology is not None else ""
+    rag, sources = rag_future.result(timeout=RAG_TIMEOUT)
+    return (state, county, zip), dt, rag, sources, climate, video_future
+
+# Run the full analysis for a location and return the /analysis response body
+def build_analysis(lat, lng):
+    (state, county, zip), dt, rag, sources, climate, video_future = prepare_analysis(lat, lng)
+    sat_vid, video_file = video_future.result(timeout=VIDEO_TIMEOUT)
+    gemini_response = generate_response(video_file, lat, lng, rag, state, county, zip, dt["Average annual cost"], dt["Percent difference from national average"], climate=climate)
+    return {
         "satelliteVideo": sat_vid,
         "geminiResponse": gemini_response,
         "sources": sources,
         "insurance cost": dt["Average annual cost"],
         "insurance percent diff": dt["Percent difference from national average"]
-    })
-    print("RET", ret)
-    return ret
+    }
+
+# Analyses are cached per grid cell: fresh for 6 hours, then served stale
+# for up to a day while one background request refreshes them
+ANALYSIS_GRID_DEG = float(os.environ.get('ANALYSIS_GRID_DEG', 0.01))
+analysis_cache = ResponseCache(analysis_refresh, ttl=6 * 3600, stale_ttl=24 * 3600)
+
+@app.route("/analysis", methods=['POST'])
+def get_info():
+    inp = LocationInput(**request.json)
+    lat, lng = snap(inp.lat, inp.lng, ANALYSIS_GRID_DEG)
+    ret = analysis_cache.get_or_compute((lat, lng), lambda: build_analysis(lat, lng))
+    return jsonify(ret)
+
+# Same analysis as /analysis, streamed as NDJSON so the client can render as
+# soon as each part is ready: sources and insurance data first, then the
+# satellite video link, then the Gemini text in chunks as it is generated.
+# A cached analysis is replayed in the same event order.
+@app.route("/analysis/stream", methods=['POST'])
+def stream_info():
+    inp = LocationInput(**request.json)
+    lat, lng = snap(inp.lat, inp.lng, ANALYSIS_GRID_DEG)
+    cached = analysis_cache.peek((lat, lng))
+    if cached is not None:
+        def replay():
+            yield json.dumps({k: cached[k] for k in ("sources", "insurance cost", "insurance percent diff")}) + "\n"
+            yield json.dumps({"satelliteVideo": cached["satelliteVideo"]}) + "\n"
+            yield json.dumps({"geminiResponse": cached["geminiResponse"]}) + "\n"
+            yield json.dumps({"done": True}) + "\n"
+        return Response(replay(), mimetype='application/x-ndjson')
+
+    (state, county, zip), dt, rag, sources, climate, video_future = prepare_analysis(lat, lng)
+
+    def events():
+        yield json.dumps({
+            "sources": sources,
+            "insurance cost": dt["Average annual cost"],
+            "insurance percent diff": dt["Percent difference from national average"]
+        }) + "\n"
+        sat_vid, video_file = video_future.result(timeout=VIDEO_TIMEOUT)
+        yield json.dumps({"satelliteVideo": sat_vid}) + "\n"
+        parts = []
+        for text in generate_response(video_file, lat, lng, rag, state, county, zip, dt["Average annual cost"], dt["Percent difference from national average"], stream=True, climate=climate):
+            parts.append(text)
+            yield json.dumps({"geminiResponse": text}) + "\n"
+        analysis_cache.put((lat, lng), {
+            "satelliteVideo": sat_vid,
+            "geminiResponse": "".join(parts),
+            "sources": sources,
+            "insurance cost": dt["Average annual cost"],
+            "insurance percent diff": dt["Percent difference from national average"]
+        })
+        yield json.dumps({"done": True}) + "\n"
+
+    return Response(stream_with_context(events()), mimetype='application/x-ndjson')
+
+# Readiness probe. The storm and insurance data are loaded before the app
+# serves, so the lightweight endpoints are ready whenever this answers; with
+# ?all=1 it returns 503 until the lazily created clients /analysis needs are
+# up as well. Lists the state of each client either way.
+@app.route("/ready", methods=['GET'])
+def ready():
+    components = lazy.status()
+    ok = request.args.get('all') != '1' or all(state == 'ready' for state in components.values())
+    return jsonify({'ready': ok, 'components': components}), 200 if ok else 503
 
+# Development server; serve.py runs the pre-forked production setup
 if __name__ == "__main__":
     app.run(debug=True)
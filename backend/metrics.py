@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# In-process latency histograms and counters, exported in the Prometheus
+# text format by the /metrics endpoint.
+#
+# Stages of a request are timed with `span("geocode")` (or the `timed`
+# decorator) into the stage_duration_seconds histogram, labelled by stage;
+# a span that raises also counts towards stage_errors_total. Metrics are per
+# process, so with several workers each one reports its own.
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+# (name, labels) -> [count per bucket..., +Inf count, sum]
+_histograms = {}
+# (name, labels) -> value
+_counters = {}
+_help = {
+    'stage_duration_seconds': 'Time spent in each stage of request handling',
+    'stage_errors_total': 'Stages that raised',
+    'request_duration_seconds': 'Time to handle a request, by endpoint',
+    'requests_total': 'Requests handled, by endpoint and status',
+    'geocode_total': 'Reverse geocodes, by source (offline or google)',
+}
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+                break
+        else:
+            histogram[len(BUCKETS)] += 1
+        histogram[-1] += value
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc('stage_errors_total', stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('stage_duration_seconds', elapsed, stage=stage)
+        logger.debug("span stage=%s seconds=%.4f", stage, elapsed)
+
+def timed(stage):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+# All metrics in the Prometheus text exposition format
+def render():
+    with _lock:
+        histograms = {key: list(values) for key, values in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# HELP {name} {_help.get(name, name)}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), values[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {values[-1]}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# HELP {name} {_help.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,16 +1,163 @@
-from embed import embed
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+from metrics import span
+
+# Retrieval of news articles for the Gemini prompt.
+#
+# Retriever embeds the location query, asks the index for the nearest
+# articles and packs their contents into a prompt context: matches are taken
+# in score order, paragraphs already seen (syndicated copies, repeated
+# boilerplate) are dropped, and the text is cut to a token budget. Results are
+# cached per (state, county, zip) when given a ResponseCache.
+#
+# The index is a Pinecone Index, or a LocalIndex loaded from a snapshot
+# exported with `python pc.py export <snapshot.npz>` for offline runs; both
+# answer query(vector=..., top_k=..., include_metadata=...) the same way.
+
+TOP_K = 10
+# Retrieved text allowed into the prompt, estimated at CHARS_PER_TOKEN
+# characters per token
+TOKEN_BUDGET = 6000
+CHARS_PER_TOKEN = 4
+# Vectors fetched per request when exporting a snapshot
+EXPORT_BATCH = 100
+
+def query_prompt(state, county, zip):
+    return f"News about hurricanes, hurricane damage, hurricane preparedness, sea level rise, property values in {county}, {state} at zip code {zip}"
+
+# Flat in-process index over a snapshot of the Pinecone index, scored by
+# cosine similarity
+class LocalIndex:
+    def __init__(self, ids, vectors, metadata):
+        self.ids = list(ids)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(self.ids), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.where(norms > 0, norms, 1)
+        self.metadata = list(metadata)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as snapshot:
+            return cls(snapshot['ids'].tolist(), snapshot['vectors'], json.loads(str(snapshot['metadata'])))
+
+    def save(self, path):
+        np.savez(path, ids=np.array(self.ids, dtype=str), vectors=self.vectors,
+                 metadata=np.array(json.dumps(self.metadata)))
+
+    def query(self, vector, top_k=TOP_K, include_metadata=False, **kwargs):
+        query = np.asarray(vector, dtype=np.float32)
+        scores = self.vectors @ (query / max(np.linalg.norm(query), 1e-12))
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        matches = []
+        for i in top:
+            match = {'id': self.ids[i], 'score': float(scores[i])}
+            if include_metadata:
+                match['metadata'] = self.metadata[i]
+            matches.append(match)
+        return {'matches': matches}
+
+# Copy every vector of a Pinecone index into a LocalIndex
+def export_snapshot(index, batch=EXPORT_BATCH):
+    ids, vectors, metadata = [], [], []
+    for page in index.list():
+        for start in range(0, len(page), batch):
+            fetched = index.fetch(ids=page[start:start + batch])
+            for vector_id, vector in fetched.vectors.items():
+                ids.append(vector_id)
+                vectors.append(vector.values)
+                metadata.append(vector.metadata or {})
+    return LocalIndex(ids, vectors, metadata)
+
+# `text` cut to at most `limit` characters, at a paragraph or sentence end
+# when one falls in its second half
+def truncate(text, limit):
+    if len(text) <= limit:
+        return text
+    # One extra character so an end right at the limit is found
+    cut = text[:limit + 1]
+    for end in ('\n\n', '. ', '\n', ' '):
+        pos = cut.rfind(end)
+        if pos >= limit // 2:
+            return cut[:pos + (1 if end == '. ' else 0)].rstrip()
+    return text[:limit].rstrip()
+
+# Prompt context and source URLs from query matches, deduplicated by
+# paragraph and cut to `token_budget`
+def build_context(matches, token_budget=TOKEN_BUDGET):
+    remaining = token_budget * CHARS_PER_TOKEN
+    seen = set()
+    context, sources = "", []
+    for match in matches:
+        metadata = match['metadata']
+        paragraphs = []
+        for paragraph in re.split(r'\n\s*\n', metadata.get('content', '')):
+            key = ' '.join(paragraph.lower().split())
+            if key and key not in seen:
+                seen.add(key)
+                paragraphs.append(paragraph.strip())
+        if not paragraphs:
+            continue
+        content = truncate("\n\n".join(paragraphs), remaining)
+        if not content:
+            break
+        context += content + "\n\n\n"
+        remaining -= len(content) + 3
+        if metadata.get('url') not in sources:
+            sources.append(metadata.get('url'))
+        if remaining <= 0:
+            break
+    return context, sources
+
+class Retriever:
+    # embedder: prompts -> one vector per prompt, used instead of embedding
+    # with model and tokenizer in this process (see embed_pool.EmbedClient)
+    def __init__(self, index, model, tokenizer, cache=None, top_k=TOP_K, token_budget=TOKEN_BUDGET, embedder=None):
+        self.index = index
+        self.model = model
+        self.tokenizer = tokenizer
+        self.embedder = embedder
+        self.cache = cache
+        self.top_k = top_k
+        self.token_budget = token_budget
+
+    # (prompt context, source URLs) for a location
+    def retrieve(self, state, county, zip):
+        if self.cache is None:
+            return self._retrieve(state, county, zip)
+        return self.cache.get_or_compute((state, county, zip), lambda: self._retrieve(state, county, zip))
+
+    def embed(self, prompts):
+        if self.embedder is not None:
+            return self.embedder(prompts)
+        # Imported here: embed pulls in torch and transformers
+        from embed import embed
+        return embed(prompts, self.model, self.tokenizer)
+
+    def _retrieve(self, state, county, zip):
+        with span('embed'):
+            vectors = self.embed([query_prompt(state, county, zip)])
+        with span('pinecone_query'):
+            response = self.index.query(
+                vector = vectors[0].tolist(),
+                top_k = self.top_k,
+                include_metadata = True
+            )
+        return build_context(response['matches'], self.token_budget)
+
 def retrieve_from_pinecone(index, model, tokenizer, state, county, zip):
-    prompts = [f"News about hurricanes, hurricane damage, hurricane preparedness, sea level rise, property values in {county}, {state} at zip code {zip}"]
-    vectors = embed(prompts, model, tokenizer)
-    response = index.query(
-        vector = vectors.tolist(),
-        top_k = 10,
-        include_metadata = True
-    )
-    string_resp = ""
-    sources = []
-    print(response)
-    for res in response['matches']:
-        string_resp += res['metadata']["content"] + "\n\n\n"
-        sources.append(res["metadata"]['url'])
-    return string_resp, sources
\ No newline at end of file
+    return Retriever(index, model, tokenizer).retrieve(state, county, zip)
+
+if __name__ == "__main__":
+    # python pc.py export snapshot.npz  (PINECONE_API_KEY must be set)
+    from pinecone import Pinecone
+    if len(sys.argv) != 3 or sys.argv[1] != 'export':
+        sys.exit("usage: python pc.py export <snapshot.npz>")
+    pinecone = Pinecone(api_key=os.environ.get('PINECONE_API_KEY', ''))
+    export_snapshot(pinecone.Index("news-hurricanes")).save(sys.argv[2])
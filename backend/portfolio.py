@@ -0,0 +1,128 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+# Hurricane exposure summaries for many locations at once.
+#
+# Storm Ids are integer-coded once so each location's hits can be grouped with
+# a sort and numpy reductions instead of a pandas groupby. Large inputs are
+# split into chunks and scored on a process pool.
+#
+# The pool is fork-only: workers inherit the scorer (and its read-only
+# arrays) from the parent instead of having it pickled to them. Forking a
+# process that already runs threads can deadlock the child on a lock another
+# thread held, so start_pool() must be called at startup before any thread
+# starts, and it forks every worker right away. Workers are never forked
+# again: when the storm data is reloaded, each worker loads the new
+# generation itself from the on-disk caches (storm_data.load_scorer) the
+# first time it gets a chunk of it. Without a pool, everything is scored
+# in-process. A pool broken by a dead worker (e.g. OOM-killed) cannot be
+# forked again once threads run, so it is dropped and scoring falls back to
+# in-process.
+
+logger = logging.getLogger(__name__)
+
+# Inputs with at least this many points are scored on the process pool
+PARALLEL_THRESHOLD = 2000
+CHUNK_SIZE = 500
+
+class ExposureScorer:
+    def __init__(self, df, track_index):
+        self.track_index = track_index
+        self.codes, self.ids = pd.factorize(df['Id'])
+        names = df.groupby(self.codes)['Name'].first()
+        self.names = names.reindex(range(len(self.ids))).to_numpy(dtype=object)
+        self.max_wind = df['MaxWind'].to_numpy(dtype=np.float64)
+
+    # Summary for one location: its `top` nearest storms plus overall figures
+    def score(self, lat, lng, top=5):
+        pos, distances = self.track_index.intersect(lat, lng)
+        summary = {'lat': lat, 'lng': lng, 'count': 0, 'minDistanceKm': None, 'maxWind': None, 'storms': []}
+        if not len(pos):
+            return summary
+
+        codes = self.codes[pos]
+        order = np.lexsort((distances, codes))
+        codes, distances, winds = codes[order], distances[order], self.max_wind[pos][order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        storm_codes = codes[starts]
+        storm_dist = distances[starts]
+        storm_wind = np.fmax.reduceat(winds, starts)
+
+        nearest = np.argsort(storm_dist, kind='stable')[:top]
+        summary['count'] = int(len(starts))
+        summary['minDistanceKm'] = float(storm_dist[nearest[0]])
+        summary['maxWind'] = float(np.nanmax(storm_wind)) if not np.isnan(storm_wind).all() else None
+        summary['storms'] = [
+            {
+                'id': self.ids[c],
+                'name': self.names[c],
+                'minDistanceKm': float(d),
+                'maxWind': None if np.isnan(w) else float(w),
+            }
+            for c, d, w in zip(storm_codes[nearest], storm_dist[nearest], storm_wind[nearest])
+        ]
+        return summary
+
+    def score_many(self, points, top=5):
+        return [self.score(lat, lng, top) for lat, lng in points]
+
+# Set in the parent before the pool forks, inherited by the workers; a
+# worker replaces them when it loads a newer generation
+_scorer = None
+_generation = None
+_pool = None
+
+def _warm(seconds):
+    time.sleep(seconds)
+
+# Fork `workers` scoring processes now, while `data` is loaded and no other
+# thread is running
+def start_pool(data, workers=None):
+    global _scorer, _generation, _pool
+    workers = workers or os.cpu_count()
+    _scorer, _generation = data.scorer, data.generation
+    _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+    # Busy every worker at once so all of them are started by this call
+    list(_pool.map(_warm, [0.05] * workers))
+    return _pool
+
+def _score_chunk(args):
+    global _scorer, _generation
+    generation, source, points, top = args
+    if generation != _generation:
+        from storm_data import load_scorer
+        _scorer, _generation = load_scorer(*source), generation
+    return _scorer.score_many(points, top)
+
+# Yield one summary per (lat, lng) point of the StormData `data`, in input
+# order. Small inputs are scored in-process; large ones are spread over the
+# process pool when one was started.
+def summarize_locations(data, points, top=5, parallel=None):
+    global _pool
+    points = [(float(lat), float(lng)) for lat, lng in points]
+    if parallel is None:
+        parallel = len(points) >= PARALLEL_THRESHOLD
+    if not parallel or _pool is None or data.source is None:
+        for lat, lng in points:
+            yield data.scorer.score(lat, lng, top)
+        return
+
+    chunks = [(data.generation, data.source, points[i:i + CHUNK_SIZE], top)
+              for i in range(0, len(points), CHUNK_SIZE)]
+    done = 0
+    try:
+        for summaries in _pool.map(_score_chunk, chunks):
+            yield from summaries
+            done += 1
+    except BrokenProcessPool:
+        logger.exception("portfolio pool broken, scoring in-process from now on")
+        _pool = None
+        for _, _, chunk, _ in chunks[done:]:
+            yield from data.scorer.score_many(chunk, top)
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Snap a coordinate to a grid of `grid_deg` degrees for use as a cache key
+def snap(lat, lng, grid_deg):
+    return (round(round(lat / grid_deg) * grid_deg, 6), round(round(lng / grid_deg) * grid_deg, 6))
+
+# In-process cache of computed responses.
+#
+# An entry is fresh for `ttl` seconds and served as is. For a further
+# `stale_ttl` seconds it is still served immediately, but the first such hit
+# starts a background refresh. Concurrent misses on the same key share one
+# computation: the first caller computes, the rest wait on its future.
+# Refreshes run on `executor`, which must not be a pool the computation
+# itself submits to and waits on, or the refreshes can starve it.
+class ResponseCache:
+    def __init__(self, executor, ttl=6 * 3600, stale_ttl=24 * 3600, max_entries=10000):
+        self.executor = executor
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    # Cached value for key if it is fresh or stale, else None; does not refresh
+    def peek(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() >= entry[1] + self.stale_ttl:
+                return None
+            return entry[0]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.time() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now < entry[1]:
+                self.entries.move_to_end(key)
+                return entry[0]
+            if entry is not None and now < entry[1] + self.stale_ttl:
+                if key not in self.inflight:
+                    self.inflight[key] = future = Future()
+                    self.executor.submit(self._compute, key, compute, future)
+                return entry[0]
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                self.inflight[key] = future = Future()
+        if owner:
+            self._compute(key, compute, future)
+        return future.result()
+
+    def _compute(self, key, compute, future):
+        try:
+            value = compute()
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            self.put(key, value)
+            future.set_result(value)
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
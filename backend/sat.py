@@ -6,8 +6,6 @@
 import pyproj
 import ee
 
-ee.Authenticate(auth_mode="localhost")
-
 # class SeaLevel:
 #     def __init__(self):
 #         self.gis = GIS()
@@ -48,12 +46,23 @@ ee.Authenticate(auth_mode="localhost")
 #         if results_3.features: return 9        
 #         return 0
     
+# Query windows are centred on a grid of this spacing (degrees), so nearby
+# coordinates render, and cache, the same thumbnail
+SNAP_DEG = 0.01
+
 class ImgSat:
+    # Authenticates on construction (not at import), so importing this module
+    # stays cheap
     def __init__(self):
+        ee.Authenticate(auth_mode="localhost")
         ee.Initialize(project = "ai-atl-hurricane") # direct-plasma-379617
         self.landsat = ee.ImageCollection('LANDSAT/LC08/C02/T1_L2').filterDate('2014-10-27', '2024-10-27').filter(ee.Filter.lt('CLOUD_COVER', 5))
+    def bbox(self, lat, long):
+        lat = round(round(lat / SNAP_DEG) * SNAP_DEG, 6)
+        long = round(round(long / SNAP_DEG) * SNAP_DEG, 6)
+        return (long - 0.05, lat - 0.05, long + 0.05, lat + 0.05)
     def query(self, lat, long):
-        bbox = ee.Geometry.BBox(long - 0.05, lat - 0.05, long + 0.05, lat + 0.05)
+        bbox = ee.Geometry.BBox(*self.bbox(lat, long))
         landsat_collection = self.landsat.filterBounds(bbox)
         video_args = {
             'dimensions': 480,
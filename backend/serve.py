@@ -0,0 +1,194 @@
+import argparse
+import gc
+import logging
+import os
+import secrets
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+# Production serving: pre-forked HTTP workers sharing data loaded once.
+#
+# The parent first forks EMBED_WORKERS embedding inference processes (see
+# embed_pool.py), then imports main with the embedding calls pointed at them
+# and background warm-up off. That loads the storm table and its indexes,
+# the exposure grid, the climatology and the insurance table in the parent.
+# The heap is then frozen with gc.freeze(), so the collector does not write
+# to (and so copy) the shared objects' pages. The parent forks WORKERS HTTP
+# workers, each running a threaded werkzeug server on the one listening
+# socket; the kernel spreads connections among them and copy-on-write keeps
+# one copy of the read-only data.
+#
+# Threads and gRPC channels do not survive a fork, so each worker starts its
+# own storm data watcher and builds its own Gemini and Earth Engine clients
+# (warmed in the background unless WARM_UP=0). Only one process writes the
+# HURDAT2 cache, exposure grid and climatology of a new release: a builder
+# process forked alongside the workers (see storm_data.StormFileBuilder). The
+# workers' watchers run with build=False and reload once its files exist, so
+# every worker maps the same files. Response caches and metrics are per
+# worker. The parent runs no threads of its own; it restarts any child that
+# exits and stops them all on SIGTERM or SIGINT.
+#
+# Run from backend/: python serve.py [--workers 4] [--embed-workers 1] [--port 5000]
+
+logger = logging.getLogger('serve')
+
+BACKLOG = 1024
+# Seconds to wait for an embedding worker's socket to appear
+EMBED_START_TIMEOUT = 30.0
+
+def start_embed_worker(address, authkey, threads):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            from embed_pool import serve_embeddings
+            serve_embeddings(address, authkey, backend=os.environ.get('EMBED_BACKEND', 'torch'), threads=threads)
+        except BaseException:
+            logger.exception("embedding worker failed")
+        finally:
+            os._exit(1)
+    return pid
+
+def start_http_worker(main, sock, host, port, warm):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            run_http_worker(main, sock, host, port, warm)
+        except BaseException:
+            logger.exception("HTTP worker failed")
+        finally:
+            os._exit(1)
+    return pid
+
+def start_builder(main):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            from storm_data import StormFileBuilder
+            watcher = main.storm_watcher
+            StormFileBuilder(watcher.path, watcher.grid_dir, watcher.interval, watcher.compact).run()
+        except BaseException:
+            logger.exception("storm file builder failed")
+        finally:
+            os._exit(1)
+    return pid
+
+def run_http_worker(main, sock, host, port, warm):
+    from storm_data import StormDataWatcher
+    from werkzeug.serving import make_server
+
+    # The parent's watcher was stopped before the fork. The new one starts
+    # from the signature of the data this worker inherited, so a worker forked
+    # after the files changed still reloads them, and leaves building the
+    # files to the builder process.
+    inherited = main.storm_watcher
+    watcher = StormDataWatcher(main.swap_storm_data, inherited.path, inherited.years, inherited.feed_dir,
+                               inherited.grid_dir, inherited.interval, inherited.compact, build=False)
+    watcher.seen, watcher.loaded_on = inherited.seen, inherited.loaded_on
+    main.storm_watcher = watcher
+    watcher.start()
+    if warm:
+        main.lazy.warm_up([main.gemini_client, main.isat, main.retriever])
+
+    server = make_server(host, port, main.app, threaded=True, fd=sock.fileno())
+    logger.info("worker %d serving on %s:%d", os.getpid(), host, port)
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-forked multi-process server for the backend")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--embed-workers', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    # Embedding workers first, before the parent holds any data or threads
+    socket_dir = tempfile.mkdtemp(prefix='embed-')
+    authkey = secrets.token_bytes(16)
+    addresses = [os.path.join(socket_dir, f"embed-{i}.sock") for i in range(args.embed_workers)]
+    threads = max(1, (os.cpu_count() or 1) // args.embed_workers)
+    embed_workers = {start_embed_worker(address, authkey, threads): address for address in addresses}
+    deadline = time.monotonic() + EMBED_START_TIMEOUT
+    while not all(os.path.exists(address) for address in addresses):
+        if time.monotonic() > deadline:
+            raise SystemExit("embedding workers did not start")
+        time.sleep(0.05)
+
+    warm = os.environ.get('WARM_UP', '1') == '1'
+    # No portfolio process pool per worker: the HTTP workers already spread
+    # batches over the cores, and a pool must not be inherited across forks
+    os.environ.update(EMBED_SERVER=','.join(addresses), EMBED_AUTHKEY=authkey.hex(), WARM_UP='0',
+                      PORTFOLIO_WORKERS='0')
+    import main as app_module
+    # On a cold cache the watcher is building the grid and climatology; the
+    # join waits for it, so the workers inherit the complete data
+    app_module.storm_watcher.stop()
+    app_module.storm_watcher.join()
+
+    sock = socket.socket(socket.AF_INET6 if ':' in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(BACKLOG)
+    sock.set_inheritable(True)
+
+    # Everything loaded so far is shared read-only with the workers
+    gc.collect()
+    gc.freeze()
+
+    builder = start_builder(app_module)
+    http_workers = set()
+    for _ in range(args.workers):
+        http_workers.add(start_http_worker(app_module, sock, args.host, args.port, warm))
+    logger.info("serving on %s:%d with %d HTTP and %d embedding workers",
+                args.host, args.port, args.workers, args.embed_workers)
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in [builder] + list(http_workers) + list(embed_workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while http_workers or embed_workers or builder:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if stopping:
+            http_workers.discard(pid)
+            embed_workers.pop(pid, None)
+            if pid == builder:
+                builder = None
+            continue
+        logger.warning("worker %d exited with status %d, restarting", pid, os.waitstatus_to_exitcode(status))
+        time.sleep(1.0)
+        if pid == builder:
+            builder = start_builder(app_module)
+        elif pid in http_workers:
+            http_workers.remove(pid)
+            http_workers.add(start_http_worker(app_module, sock, args.host, args.port, warm))
+        elif pid in embed_workers:
+            address = embed_workers.pop(pid)
+            if os.path.exists(address):
+                os.remove(address)
+            embed_workers[start_embed_worker(address, authkey, threads)] = address
+    shutil.rmtree(socket_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import numpy as np
+
+from tracks import EARTH_RADIUS_KM
+
+KM_PER_DEG = np.pi * EARTH_RADIUS_KM / 180.0
+
+# Lat/lon grid over the fixes of a TrackArrays, with cells a quarter of the
+# largest MaxRadius_km in the data. A query only looks at the cells that a
+# circle of that radius around the target can reach, so its cost depends on
+# the local density of fixes rather than on the dataset span.
+#
+# Fixes are sorted by cell key (row * ncols + col), so the cells of one grid
+# row in a column range are a single contiguous slice of `order`.
+class GridIndex:
+    def __init__(self, tracks, cell_deg=None):
+        self.tracks = tracks
+        self.max_radius_km = float(tracks.radius_km.max()) if len(tracks) else 0.0
+        if cell_deg is None:
+            cell_deg = max(self.max_radius_km / KM_PER_DEG / 4, 0.25)
+        # Whole number of columns around the globe so column keys wrap exactly
+        self.ncols = max(int(360.0 // cell_deg), 1)
+        self.cell_deg = 360.0 / self.ncols
+        self.nrows = int(np.ceil(180.0 / self.cell_deg)) + 1
+
+        rows, cols = self._cell(tracks.lat, tracks.lon)
+        keys = rows * self.ncols + cols
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def _cell(self, lat, lon):
+        rows = np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+        cols = np.floor((np.asarray(lon) + 180.0) / self.cell_deg).astype(np.int64) % self.ncols
+        return rows, cols
+
+    # Column ranges (inclusive) reachable from target_lon, split at the antimeridian
+    def _col_ranges(self, target_lat, target_lon):
+        delta = self.max_radius_km / EARTH_RADIUS_KM
+        cos_lat = np.cos(np.radians(target_lat))
+        if delta >= np.pi / 2 or np.sin(delta) >= cos_lat:
+            return [(0, self.ncols - 1)]
+        dlon = np.degrees(np.arcsin(np.sin(delta) / cos_lat)) + 1e-9
+        c0 = int(np.floor((target_lon - dlon + 180.0) / self.cell_deg))
+        c1 = int(np.floor((target_lon + dlon + 180.0) / self.cell_deg))
+        if c1 - c0 + 1 >= self.ncols:
+            return [(0, self.ncols - 1)]
+        if c0 < 0:
+            return [(c0 % self.ncols, self.ncols - 1), (0, c1)]
+        if c1 >= self.ncols:
+            return [(c0, self.ncols - 1), (0, c1 % self.ncols)]
+        return [(c0, c1)]
+
+    # Positions (in track order) of the fixes in cells within reach of the target
+    def candidates(self, target_lat, target_lon):
+        if not len(self.tracks):
+            return np.empty(0, dtype=np.int64)
+        dlat = self.max_radius_km / KM_PER_DEG + 1e-9
+        r0 = max(int(np.floor((target_lat - dlat + 90.0) / self.cell_deg)), 0)
+        r1 = min(int(np.floor((target_lat + dlat + 90.0) / self.cell_deg)), self.nrows - 1)
+        col_ranges = self._col_ranges(target_lat, target_lon)
+
+        rows = np.arange(r0, r1 + 1) * self.ncols
+        lo_keys = np.concatenate([rows + c0 for c0, _ in col_ranges])
+        hi_keys = np.concatenate([rows + c1 for _, c1 in col_ranges])
+        lo = np.searchsorted(self.keys, lo_keys, side='left')
+        hi = np.searchsorted(self.keys, hi_keys, side='right')
+        slices = [self.order[a:b] for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(slices))
+
+    # Same contract as TrackArrays.intersect, restricted to candidate fixes
+    def intersect(self, target_lat, target_lon):
+        return self.tracks.intersect(target_lat, target_lon, self.candidates(target_lat, target_lon))
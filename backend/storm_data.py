@@ -0,0 +1,182 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+from tracks import TrackArrays
+from spatial import GridIndex
+from hurdat import load_hurdat, cache_path
+from exposure_grid import ExposureGrid, GRID_DIR, load_grid, grid_path
+from portfolio import ExposureScorer
+from footprint import FootprintIndex
+from storm_tracks import StormTracks
+from climatology import load_climatology, climatology_path
+
+# The in-memory storm dataset and its lookup structures, reloaded in place.
+#
+# StormData bundles the HURDAT2 table (last `years` years, with advisory
+# storms merged in) with every index built over it, so a request that takes
+# one reference sees a consistent snapshot. StormDataWatcher polls the
+# HURDAT2 file and the advisory directory, builds a fresh StormData in the
+# background when either changes (or the date rolls over and the `years`
+# cutoff moves), and hands it to `on_swap`. Appended storms are ingested
+# incrementally by hurdat.load_hurdat; until the exposure grid is rebuilt for
+# the new release, the previous grid is used and the new storms are refined
+# on every query.
+#
+# With several processes serving the same files (serve.py), only one should
+# write the HURDAT2 cache, grid and climatology: a StormFileBuilder builds
+# them, and the serving processes' watchers run with build=False and reload
+# once the files for the new release exist, memory-mapping them.
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for a new release or advisory
+POLL_INTERVAL = 60
+
+_generations = itertools.count()
+
+# `source` is the load_storm_data arguments (path, years, feed_dir, grid_dir,
+# compact) the data can be loaded again from, e.g. by portfolio pool workers
+class StormData:
+    def __init__(self, df, grid=None, source=None, climatology=None):
+        self.df = df
+        self.source = source
+        self.generation = next(_generations)
+        self.track_index = GridIndex(TrackArrays.from_df(df))
+        if grid is not None:
+            # Precomputed per-cell storm lists, refined exactly over the
+            # candidate storms' fixes; falls back to the grid index
+            self.exposure_index = ExposureGrid(grid, df, self.track_index.tracks, self.track_index)
+        else:
+            self.exposure_index = self.track_index
+        # Per-cell storm climatology over the full HURDAT2 record
+        self.climatology = climatology
+        self.scorer = ExposureScorer(df, self.exposure_index)
+        self.footprint_index = FootprintIndex(df)
+        self.storm_names = df.drop_duplicates('Id').set_index('Id')['Name']
+        self.storm_tracks = StormTracks(df)
+        self.loaded_on = date.today()
+
+def load_storm_data(path='hurdat2.txt', years=15, feed_dir=None, grid_dir=GRID_DIR,
+                    build_grid=True, compact=False):
+    df = load_hurdat(path, years=years, feed_dir=feed_dir, compact=compact)
+    return StormData(df, load_grid(path, grid_dir, build=build_grid),
+                     source=(path, years, feed_dir, grid_dir, compact),
+                     climatology=load_climatology(path, build=build_grid))
+
+# Just the ExposureScorer of the storm data for `source`, from the caches
+# the serving process has already written
+def load_scorer(path, years, feed_dir, grid_dir, compact):
+    df = load_hurdat(path, years=years, feed_dir=feed_dir, compact=compact)
+    track_index = GridIndex(TrackArrays.from_df(df))
+    grid = load_grid(path, grid_dir, build=False)
+    index = ExposureGrid(grid, df, track_index.tracks, track_index) if grid is not None else track_index
+    return ExposureScorer(df, index)
+
+# Write the HURDAT2 cache, exposure grid and climatology for `path` if missing
+def build_storm_files(path, grid_dir=GRID_DIR, compact=False):
+    load_hurdat(path, compact=compact)
+    load_grid(path, grid_dir)
+    load_climatology(path)
+
+def storm_files_built(path, grid_dir=GRID_DIR, compact=False):
+    return all(os.path.exists(os.path.join(target, 'meta.json'))
+               for target in (cache_path(path, compact=compact), grid_path(path, grid_dir), climatology_path(path)))
+
+# `initial` is the StormData being served when it was loaded with
+# build_grid=False: the watcher first builds the grid and climatology it is
+# missing and swaps in the complete data, then starts polling.
+class StormDataWatcher(threading.Thread):
+    def __init__(self, on_swap, path='hurdat2.txt', years=15, feed_dir=None,
+                 grid_dir=GRID_DIR, interval=POLL_INTERVAL, compact=False, build=True, initial=None):
+        super().__init__(daemon=True)
+        self.on_swap = on_swap
+        self.build = build
+        self.initial = initial
+        self.path = path
+        self.years = years
+        self.feed_dir = feed_dir
+        self.grid_dir = grid_dir
+        self.interval = interval
+        self.compact = compact
+        self.stopped = threading.Event()
+        self.seen = self.signature()
+        self.loaded_on = date.today()
+
+    # (name, mtime, size) of the HURDAT2 file and every advisory file
+    def signature(self):
+        paths = [self.path]
+        if self.feed_dir and os.path.isdir(self.feed_dir):
+            paths += [os.path.join(self.feed_dir, name) for name in sorted(os.listdir(self.feed_dir))]
+        stats = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stats.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(stats)
+
+    # Returns False, leaving the reload to the next poll, when build=False and
+    # the files for this release are not built yet
+    def reload(self):
+        if not self.build and not storm_files_built(self.path, self.grid_dir, self.compact):
+            logger.debug("waiting for the storm files of %s to be built", self.path)
+            return False
+        data = load_storm_data(self.path, self.years, self.feed_dir, self.grid_dir,
+                               build_grid=False, compact=self.compact)
+        # Serve the new storms straight away, then swap again once the grid
+        # and climatology for this release are built
+        self.on_swap(data)
+        self.loaded_on = data.loaded_on
+        self.complete(data)
+        logger.info("storm data reloaded rows=%d", len(data.df))
+        return True
+
+    # Swap in `data` with the grid and climatology of its release when it
+    # was loaded without them, building them first
+    def complete(self, data):
+        if not (os.path.exists(os.path.join(grid_path(self.path, self.grid_dir), 'meta.json'))
+                and os.path.exists(os.path.join(climatology_path(self.path), 'meta.json'))):
+            self.on_swap(StormData(data.df, load_grid(self.path, self.grid_dir), data.source,
+                                   load_climatology(self.path)))
+            logger.info("storm grid and climatology built for %s", self.path)
+
+    def run(self):
+        if self.initial is not None:
+            try:
+                self.complete(self.initial)
+            except Exception:
+                logger.exception("Building the storm grid and climatology failed")
+            self.initial = None
+        while not self.stopped.wait(self.interval):
+            signature = self.signature()
+            if signature == self.seen and date.today() == self.loaded_on:
+                continue
+            # Wait for a file that is still being written to settle
+            time.sleep(1.0)
+            if self.signature() != signature:
+                continue
+            try:
+                if self.reload():
+                    self.seen = signature
+            except Exception:
+                logger.exception("Storm data reload failed")
+
+    def stop(self):
+        self.stopped.set()
+
+# Watches the HURDAT2 file like StormDataWatcher but only writes the files
+# built from it, for the serving processes to load
+class StormFileBuilder(StormDataWatcher):
+    def __init__(self, path='hurdat2.txt', grid_dir=GRID_DIR, interval=POLL_INTERVAL, compact=False):
+        super().__init__(None, path, None, None, grid_dir, interval, compact)
+
+    def reload(self):
+        build_storm_files(self.path, self.grid_dir, self.compact)
+        self.loaded_on = date.today()
+        logger.info("storm files built for %s", self.path)
+        return True
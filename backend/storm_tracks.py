@@ -0,0 +1,112 @@
+import json
+from functools import lru_cache
+
+import numpy as np
+
+from spatial import KM_PER_DEG
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# /find_hurricanes responses assembled from per-storm track blobs.
+#
+# Each storm's fixes are a contiguous row range of the table, so its points
+# are column slices. The serialized points array of a storm is built once per
+# (storm, simplification, shape) and cached, and a response is the selected
+# storms' small headers spliced around those blobs. Keys are emitted sorted,
+# matching what jsonify produced for the original response.
+#
+# Points come in two shapes: a list of {lat, lng, r, speed} objects (the
+# original response), or columnar {lat: [...], lng: [...], r: [...],
+# speed: [...]}. Tracks can be simplified with Douglas-Peucker for map
+# rendering; the radius and speed of the kept fixes are returned unchanged.
+
+TRACK_COLORS = ['#343131', '#A04747', '#D8A25E', '#EEDF7A', '#E2F1E7']
+# Cached point blobs per StormTracks
+BLOB_CACHE_SIZE = 2048
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode()
+
+# Positions of the points kept by Douglas-Peucker with a tolerance in km
+def simplify_track(lat, lon, tolerance_km):
+    if len(lat) < 3:
+        return np.arange(len(lat))
+    # Local equirectangular frame in km
+    x = lon * np.cos(np.radians(lat.mean())) * KM_PER_DEG
+    y = lat * KM_PER_DEG
+    keep = np.zeros(len(lat), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(lat) - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        px, py = x[a + 1:b] - x[a], y[a + 1:b] - y[a]
+        length = np.hypot(dx, dy)
+        distance = np.abs(px * dy - py * dx) / length if length > 0 else np.hypot(px, py)
+        i = int(distance.argmax())
+        if distance[i] > tolerance_km:
+            keep[a + 1 + i] = True
+            stack += [(a, a + 1 + i), (a + 1 + i, b)]
+    return np.flatnonzero(keep)
+
+class StormTracks:
+    def __init__(self, df):
+        codes = df['Id'].to_numpy()
+        self.starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, np.int64)
+        self.stops = np.r_[self.starts[1:], len(codes)].astype(np.int64)
+        # Storm number of every row
+        self.storm_of = np.repeat(np.arange(len(self.starts)), self.stops - self.starts)
+        self.ids = codes[self.starts].astype(str)
+        self.names = df['Name'].to_numpy()[self.starts].astype(str)
+        # Position of each storm in id order
+        self.id_rank = np.argsort(np.argsort(self.ids, kind='stable'), kind='stable')
+
+        self.lat = df['Lat'].to_numpy(dtype=np.float64)
+        self.lon = df['Lon'].to_numpy(dtype=np.float64)
+        self.radius = df['MaxRadius_km'].to_numpy(dtype=np.float64)
+        self.speed = df['MaxWind'].to_numpy(dtype=np.float64)
+        self.max_speed = np.maximum.reduceat(self.speed, self.starts) if len(self.starts) else np.empty(0)
+        self.points = lru_cache(maxsize=BLOB_CACHE_SIZE)(self._points)
+
+    # The `top` storms hit at the given rows, nearest first. Track positions
+    # are rounded to 0.1 degree, so equal distances are common; ties resolve
+    # as in the original groupby('Id') + sort_values: a quicksort of the
+    # per-storm minima in id order.
+    def nearest(self, pos, distances, top=5):
+        if not len(pos):
+            return np.empty(0, dtype=np.int64)
+        storm = self.storm_of[pos]
+        order = np.lexsort((distances, self.id_rank[storm]))
+        storm, distances = storm[order], distances[order]
+        first = np.flatnonzero(np.r_[True, storm[1:] != storm[:-1]])
+        storm, distances = storm[first], distances[first]
+        return storm[np.argsort(distances, kind='quicksort')[:top]]
+
+    # Serialized points array (or columnar object) of one storm
+    def _points(self, storm, simplify_km=None, columnar=False):
+        rows = np.arange(self.starts[storm], self.stops[storm])
+        if simplify_km:
+            rows = rows[simplify_track(self.lat[rows], self.lon[rows], simplify_km)]
+        columns = {'lat': self.lat[rows].tolist(), 'lng': self.lon[rows].tolist(),
+                   'r': self.radius[rows].tolist(), 'speed': self.speed[rows].tolist()}
+        if columnar:
+            return dumps(columns)
+        return dumps([dict(zip(columns, point)) for point in zip(*columns.values())])
+
+    # JSON body for the given storms: {id: {color, maxSpeed, name, points}},
+    # colors assigned in id order
+    def response(self, storms, simplify_km=None, columnar=False):
+        parts = []
+        for color, storm in zip(TRACK_COLORS, sorted(storms, key=lambda s: self.ids[s])):
+            storm = int(storm)
+            head = dumps({'color': color, 'maxSpeed': float(self.max_speed[storm]), 'name': self.names[storm]})
+            points = self.points(storm, simplify_km, columnar)
+            parts.append(dumps(self.ids[storm]) + b':' + head[:-1] + b',"points":' + points + b'}')
+        return b'{' + b','.join(parts) + b'}'
@@ -0,0 +1,43 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Columnar view of the HURDAT2 fixes used for radius queries.
+# Lat/Lon/MaxRadius_km are kept as contiguous float64 arrays (plus the
+# radian/cosine terms the haversine needs) so a query is a single batched
+# numpy pass instead of a Python loop over DataFrame rows.
+class TrackArrays:
+    def __init__(self, lat, lon, radius_km):
+        self.lat = np.ascontiguousarray(lat, dtype=np.float64)
+        self.lon = np.ascontiguousarray(lon, dtype=np.float64)
+        self.radius_km = np.ascontiguousarray(radius_km, dtype=np.float64)
+        self.lat_rad = np.radians(self.lat)
+        self.lon_rad = np.radians(self.lon)
+        self.cos_lat = np.cos(self.lat_rad)
+
+    @classmethod
+    def from_df(cls, df):
+        return cls(df['Lat'].to_numpy(), df['Lon'].to_numpy(), df['MaxRadius_km'].to_numpy())
+
+    def __len__(self):
+        return len(self.lat)
+
+    # Haversine distance (km) from every fix, or the fixes at positions idx, to the target
+    def distances(self, target_lat, target_lon, idx=None):
+        lat_rad, lon_rad, cos_lat = self.lat_rad, self.lon_rad, self.cos_lat
+        if idx is not None:
+            lat_rad, lon_rad, cos_lat = lat_rad[idx], lon_rad[idx], cos_lat[idx]
+        target_lat_rad = np.radians(target_lat)
+        dlat = target_lat_rad - lat_rad
+        dlon = np.radians(target_lon) - lon_rad
+        a = np.sin(dlat / 2.0)**2 + cos_lat * np.cos(target_lat_rad) * np.sin(dlon / 2.0)**2
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        return EARTH_RADIUS_KM * c
+
+    # Positions of the fixes whose MaxRadius_km reaches the target, with their distances
+    def intersect(self, target_lat, target_lon, idx=None):
+        dist = self.distances(target_lat, target_lon, idx)
+        radius = self.radius_km if idx is None else self.radius_km[idx]
+        hit = np.flatnonzero(dist <= radius)
+        pos = hit if idx is None else np.asarray(idx)[hit]
+        return pos, dist[hit]
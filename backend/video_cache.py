@@ -0,0 +1,114 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Local cache of converted satellite videos and of their Gemini uploads,
+# keyed by the snapped Earth Engine bbox so nearby and repeat lookups reuse
+# the same MP4 and the same uploaded file.
+#
+# MP4s live in `directory` and are evicted least-recently-used once their
+# total size passes max_bytes (file mtime is the recency clock). Upload
+# handles are kept in memory until they near their expiry or the cache
+# holds more than max_uploads, at which point on_evict_upload is called
+# with the handle so the caller can delete it remotely.
+class VideoCache:
+    def __init__(self, directory='video_cache', max_bytes=2 << 30, max_uploads=500, on_evict_upload=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_uploads = max_uploads
+        self.on_evict_upload = on_evict_upload
+        self.uploads = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(bbox):
+        return hashlib.sha256(",".join(f"{v:.4f}" for v in bbox).encode()).hexdigest()[:32]
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp4")
+
+    # Cached MP4 for key, or None
+    def get_video(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    # Store a finished MP4 written at tmp_path under key
+    def put_video(self, key, tmp_path):
+        path = self.path(key)
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                # Skip files still being written by convert_sat_img
+                if not name.endswith('.mp4') or name.endswith('.tmp.mp4'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    # Uploaded handle for key if it is still valid for at least `margin` seconds
+    # (handed to on_evict_upload once it is dropped)
+    def get_upload(self, key, margin=3600):
+        with self.lock:
+            entry = self.uploads.get(key)
+            if entry is None:
+                return None
+            handle, expires_at = entry
+            if expires_at - time.time() >= margin:
+                self.uploads.move_to_end(key)
+                return handle
+            del self.uploads[key]
+        if self.on_evict_upload:
+            self.on_evict_upload(handle)
+        return None
+
+    # Cache an upload for key and return the handle to use. When another
+    # request already cached one for key, that one is kept and returned and
+    # the new, unshared duplicate is handed to on_evict_upload instead: the
+    # cached handle may be in use by a request about to send it to Gemini.
+    def put_upload(self, key, handle, expires_at):
+        evicted = []
+        with self.lock:
+            current = self.uploads.get(key)
+            if current is not None and current[0] is not handle:
+                evicted.append(handle)
+                handle = current[0]
+            else:
+                self.uploads[key] = (handle, expires_at)
+            self.uploads.move_to_end(key)
+            while len(self.uploads) > self.max_uploads:
+                evicted.append(self.uploads.popitem(last=False)[1][0])
+        if self.on_evict_upload:
+            for stale in evicted:
+                self.on_evict_upload(stale)
+        return handle
+
+    # Forget the upload for key (only if it is still `handle`, when given),
+    # e.g. after Gemini rejected it
+    def drop_upload(self, key, handle=None):
+        with self.lock:
+            current = self.uploads.get(key)
+            if current is not None and (handle is None or current[0] is handle):
+                del self.uploads[key]
@@ -0,0 +1,60 @@
+import numpy as np
+
+# Last resort when neither the ZIP nor the state matches anything
+DEFAULT_ZIP = "33592"
+
+# Lookup table over the insurance CSV, built once at load time.
+#
+# Exact lookups hit a dict of precomputed response records. Unknown ZIPs fall
+# back to the numerically nearest ZIP with the same 3-digit prefix (the USPS
+# sectional centre, roughly county-sized), then the nearest ZIP in the same
+# state, then the nearest ZIP overall. Without a ZIP, a ZIP from the given
+# state is used, then DEFAULT_ZIP.
+class ZipIndex:
+    def __init__(self, df):
+        self.by_zip = {}
+        for record in df.to_dict(orient='records'):
+            self.by_zip.setdefault(record['ZIP code'], record)
+
+        zips = sorted(z for z in self.by_zip if z.isdigit())
+        self.zips = zips
+        self.codes = np.array([int(z) for z in zips], dtype=np.int64)
+        self.states = np.array([self.by_zip[z]['State'] for z in zips], dtype=object)
+
+    def get(self, zipcode):
+        return self.by_zip.get(zipcode)
+
+    def get_many(self, zipcodes):
+        return [self.by_zip.get(zipcode) for zipcode in zipcodes]
+
+    # Position of the ZIP closest to `code` among the positions in `candidates`
+    def _closest(self, code, candidates):
+        if not len(candidates):
+            return None
+        return candidates[np.abs(self.codes[candidates] - code).argmin()]
+
+    def nearest(self, zipcode, state=None):
+        record = self.by_zip.get(zipcode)
+        if record is not None:
+            return record
+
+        if zipcode and zipcode[:5].isdigit() and len(self.codes):
+            code = int(zipcode[:5])
+            lo = np.searchsorted(self.codes, code // 100 * 100, side='left')
+            hi = np.searchsorted(self.codes, code // 100 * 100 + 99, side='right')
+            pos = self._closest(code, np.arange(lo, hi))
+            if pos is None and state is not None:
+                pos = self._closest(code, np.flatnonzero(self.states == state))
+            if pos is None:
+                pos = self._closest(code, np.arange(len(self.codes)))
+            if pos is not None:
+                return self.by_zip[self.zips[pos]]
+        elif state is not None and len(self.codes):
+            in_state = np.flatnonzero(self.states == state)
+            if len(in_state):
+                return self.by_zip[self.zips[in_state[len(in_state) // 2]]]
+
+        return self.by_zip.get(DEFAULT_ZIP)
+
+    def nearest_many(self, zipcodes, state=None):
+        return [self.nearest(zipcode, state) for zipcode in zipcodes]